@@ -1,17 +1,28 @@
 import json
 import os
 import re
-import time
 from datetime import datetime
 from importlib import reload
 from tkinter import filedialog
 
 import common.helpers as helpers
 import common.parser as cfg
+from modules.datastream.posstat import RTKPosStat
 from modules.rnx2rtkp import RNX2RTKPProcessor
 from modules.tps2rin import TPS2RINProcessor
 
 
+def find_rover_local_dir(file_path):
+    """local_dir of the configured rover whose name appears in file_path (longest match wins)"""
+    matches = [
+        settings["local_dir"]
+        for rover in cfg.ROVERS
+        for settings in rover["ftp"]
+        if settings["local_dir"] in file_path
+    ]
+    return max(matches, key=len) if matches else None
+
+
 class DashboardBindings:
     def __init__(self, error_signal: helpers.Signal):
         self.error_signal = error_signal
@@ -83,10 +94,9 @@ class DashboardBindings:
 
         # Process base and rover TPS files
         rover_process_dir = ""
-        if "Rover1" in rover_tps_entry.get():
-            rover_process_dir = os.path.split(os.path.abspath(__file__))[0][0].capitalize() + os.path.split(os.path.abspath(__file__))[0][1:] + "/data/" + cfg.FTP_ROVERS1_SETTINGS[0]["local_dir"] + "/process"
-        elif "Rover2" in rover_tps_entry.get():
-            rover_process_dir = os.path.split(os.path.abspath(__file__))[0][0].capitalize() + os.path.split(os.path.abspath(__file__))[0][1:] + "/data/" + cfg.FTP_ROVERS2_SETTINGS[0]["local_dir"] + "/process"
+        rover_local_dir = find_rover_local_dir(rover_tps_entry.get())
+        if rover_local_dir:
+            rover_process_dir = os.path.split(os.path.abspath(__file__))[0][0].capitalize() + os.path.split(os.path.abspath(__file__))[0][1:] + "/data/" + rover_local_dir + "/process"
         else:
             self.error_signal.emit("Please select a valid TPS file")
             return
@@ -158,7 +168,6 @@ class DashboardBindings:
         except Exception as e:
             self.error_signal.emit(f"Error executing tps2rin: {e}")
         finally:
-            time.sleep(1)
             execute_button.configure(text="Execute")
             rover_obs_entry.delete(0, 'end')
             rover_obs_entry.insert(0, rover_o_path)
@@ -195,10 +204,9 @@ class DashboardBindings:
         
         # Determine output directory based on rover file path
         try:
-            if "Rover1" in rover_rinex_file_path:
-                output_pos_dir = os.path.join(os.path.dirname(__file__), "data", cfg.FTP_ROVERS1_SETTINGS[0]["local_dir"], "output")
-            elif "Rover2" in rover_rinex_file_path:
-                output_pos_dir = os.path.join(os.path.dirname(__file__), "data", cfg.FTP_ROVERS2_SETTINGS[0]["local_dir"], "output")
+            rover_local_dir = find_rover_local_dir(rover_rinex_file_path)
+            if rover_local_dir:
+                output_pos_dir = os.path.join(os.path.dirname(__file__), "data", rover_local_dir, "output")
             else:
                 self.error_signal.emit("Invalid rover file path")
                 return
@@ -217,22 +225,27 @@ class DashboardBindings:
                 
             # Execute the RTK processing
             execute_rinex_rtk_button.configure(text="Executing...")
-            rnx2rtkp_processor.exec_rnx2rtkp(
+            success = rnx2rtkp_processor.exec_rnx2rtkp(
                 rover_rinex_file_path,
                 base_rinex_file_path,
                 base_rover_pos_file_path,
                 output_file_path
             )
+            if not success:
+                self.error_signal.emit(f"RTK processing failed: {os.path.split(output_file_path)[1]}")
 
-            # Remove events and stats files
+            # Summarize stats files into posstat.csv, then remove them and the events files
+            pos_stat = RTKPosStat()
+            stat_summary_path = os.path.join(os.path.dirname(output_pos_dir), "posstat.csv")
             for file_path in os.listdir(output_pos_dir):
-                if file_path.endswith('.pos.stat') or file_path.endswith('_events.pos'):
+                if file_path.endswith('.pos.stat'):
+                    pos_stat.summarize_and_remove(os.path.join(output_pos_dir, file_path), stat_summary_path)
+                elif file_path.endswith('_events.pos'):
                     helpers.remove_file(os.path.join(output_pos_dir, file_path))
             
         except Exception as e:
             self.error_signal.emit(f"Error during RTK processing: {str(e)}")
         finally:
-            time.sleep(1)
             if self.remove_rinex_checkbox.get():
                 if os.path.exists(rover_rinex_file_path):
                     helpers.remove_file(rover_rinex_file_path)
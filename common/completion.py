@@ -0,0 +1,98 @@
+import os
+import shutil
+import tempfile
+
+from common.executor import run_processes
+
+
+class PendingOutputs:
+    """
+    Outputs of one external command, written into a hidden directory inside the
+    destination directory and moved into place with os.replace only after the
+    command succeeded and the outputs were validated. Readers of the destination
+    directory see either no output or a complete one, so nothing has to wait on a
+    timer before reading. The hidden directory is on the same filesystem as the
+    destination, which keeps the rename atomic.
+    """
+
+    def __init__(self, dest_dir):
+        self.dest_dir = dest_dir
+        os.makedirs(dest_dir, exist_ok=True)
+        self.tmp_dir = tempfile.mkdtemp(prefix=".partial_", dir=dest_dir)
+
+    def path(self, name):
+        """Temporary path of the output that will become dest_dir/name"""
+        return os.path.join(self.tmp_dir, name).replace("\\", "/")
+
+    def get_invalid(self, required=None):
+        """
+        Why the outputs cannot be committed, or None when they can.
+        Every name in required must exist and be non-empty; without required, at
+        least one non-empty file must have been produced.
+        """
+        names = os.listdir(self.tmp_dir)
+        if required:
+            for name in required:
+                if name not in names:
+                    return f"{name} was not written"
+                if os.path.getsize(os.path.join(self.tmp_dir, name)) == 0:
+                    return f"{name} is empty"
+            return None
+        if not any(os.path.getsize(os.path.join(self.tmp_dir, name)) > 0 for name in names):
+            return "no output was written"
+        return None
+
+    def commit(self, required=None):
+        """
+        Move every output into dest_dir; the required ones go last so a reader that
+        waits for them finds their side files (.stat, _events) already in place.
+        Returns the final paths.
+        """
+        required = list(required or [])
+        names = sorted(os.listdir(self.tmp_dir), key=lambda name: name in required)
+        final_paths = []
+        for name in names:
+            final_path = os.path.join(self.dest_dir, name).replace("\\", "/")
+            os.replace(os.path.join(self.tmp_dir, name), final_path)
+            final_paths.append(final_path)
+        return final_paths
+
+    def discard(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def run_commands(name, cmds, cwd=None, shell=False):
+    """Run cmds at the same time; True when every one of them exited with 0"""
+    returncodes = run_processes(cmds, cwd=cwd, shell=shell)
+    if returncodes is None:
+        # killed by the solver executor (timeout or cancel)
+        print(f"-> {name} stopped before finishing")
+        return False
+    failed = [returncode for returncode in returncodes if returncode != 0]
+    if failed:
+        print(f"-> {name} failed with exit code {failed[0]}")
+        return False
+    return True
+
+
+def commit_outputs(name, outputs, required=None):
+    """Validate and commit outputs, returns the committed paths or None"""
+    reason = outputs.get_invalid(required)
+    if reason:
+        print(f"-> {name} output rejected: {reason}")
+        return None
+    return outputs.commit(required)
+
+
+def run_to_completion(name, cmd, outputs, required=None, cwd=None, shell=False):
+    """
+    Run cmd, check its exit code, validate its outputs and commit them.
+    outputs is the PendingOutputs the command writes into; it is always cleaned up.
+    Returns the committed paths, or None when the command failed.
+    """
+    try:
+        if not run_commands(name, [cmd], cwd=cwd, shell=shell):
+            return None
+        return commit_outputs(name, outputs, required)
+    finally:
+        outputs.discard()
@@ -0,0 +1,175 @@
+import os
+import signal
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# job of the executor thread that is running it, used by run_processes
+_current = threading.local()
+
+
+class SolverJob:
+    """Handle of a job submitted to SolverExecutor"""
+
+    def __init__(self, name, timeout=None):
+        self.name = name
+        self.timeout = timeout
+        self.status = "queued"
+        self.returncode = None
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.future = None
+        self.processes = []
+        self.lock = threading.Lock()
+
+    @property
+    def duration(self):
+        if self.started is None:
+            return None
+        return (self.finished or time.time()) - self.started
+
+    def wait(self, timeout=None):
+        """Wait for the job to finish and return its status"""
+        try:
+            self.future.result(timeout)
+        except Exception:
+            pass
+        return self.status
+
+    def cancel(self):
+        """Drop a queued job, or kill the process of a running one"""
+        if self.future.cancel():
+            self.status = "cancelled"
+            return True
+        with self.lock:
+            # the worker may have picked the job up already
+            if self.status not in ("queued", "running"):
+                return False
+            self.status = "cancelled"
+            for process in self.processes:
+                _kill_tree(process)
+        return True
+
+
+def _kill_tree(process):
+    """
+    Kill process and everything it started (the wine loader of tps2rin.exe, or the
+    command under cmd.exe/sh with shell=True); killing only the direct child would
+    leave the rest running on its files
+    """
+    if process.poll() is not None:
+        return
+    if os.name == "nt":
+        subprocess.call(
+            ["taskkill", "/T", "/F", "/PID", str(process.pid)],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+    else:
+        try:
+            # job processes lead their own process group (start_new_session)
+            os.killpg(process.pid, signal.SIGKILL)
+        except OSError:
+            process.kill()
+    process.wait()
+
+
+def run_processes(cmds, cwd=None, shell=False):
+    """
+    Run several external commands at the same time and return their exit codes in order.
+    Inside a SolverExecutor job they share the job timeout and cancel(), and all of them
+    are killed together; None is returned when they were killed.
+    """
+    job = getattr(_current, "job", None)
+    if job is None:
+        processes = [subprocess.Popen(cmd, shell=shell, cwd=cwd) for cmd in cmds]
+        return [process.wait() for process in processes]
+
+    with job.lock:
+        if job.status == "cancelled":
+            return None
+        job.processes = [
+            subprocess.Popen(cmd, shell=shell, cwd=cwd, start_new_session=os.name != "nt") for cmd in cmds
+        ]
+
+    returncodes = []
+    try:
+        for process in job.processes:
+            remaining = None
+            if job.timeout:
+                remaining = max(0.0, job.started + job.timeout - time.time())
+            returncodes.append(process.wait(remaining))
+    except subprocess.TimeoutExpired:
+        for process in job.processes:
+            _kill_tree(process)
+        job.status = "timeout"
+        return None
+    job.returncode = next((code for code in returncodes if code != 0), 0)
+    if job.status == "cancelled":
+        return None
+    return returncodes
+
+
+class SolverExecutor:
+    """
+    One bounded pool for the external solver jobs of the whole processor.
+    max_workers defaults to the number of CPUs, since each job is a CPU-bound
+    rnx2rtkp process. Jobs wait in the queue until a worker is free and report
+    queued/running/done/failed/timeout/cancelled, exit code and duration.
+    A job whose function returns False counts as failed. The executor only keeps
+    the queued and running jobs (for shutdown); callers keep the jobs they submit.
+    """
+
+    def __init__(self, max_workers=None, timeout=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.timeout = timeout or None
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="solver")
+        self.jobs = []
+        self.lock = threading.Lock()
+
+    def submit(self, func, *args, name=None, timeout=None):
+        """Queue func(*args); processes it starts through run_processes belong to the job"""
+        job = SolverJob(name or getattr(func, "__name__", "job"), timeout or self.timeout)
+        with self.lock:
+            self.jobs.append(job)
+        job.future = self.executor.submit(self._run, job, func, args)
+        job.future.add_done_callback(lambda future: self._forget(job))
+        return job
+
+    def _forget(self, job):
+        with self.lock:
+            if job in self.jobs:
+                self.jobs.remove(job)
+
+    def _run(self, job, func, args):
+        with job.lock:
+            if job.status == "cancelled":
+                return None
+            job.status = "running"
+            job.started = time.time()
+        _current.job = job
+        try:
+            result = func(*args)
+            if job.status == "running":
+                job.status = "failed" if result is False else "done"
+            return result
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+            raise
+        finally:
+            job.finished = time.time()
+            # the Popen handles are not needed once the job is over
+            job.processes = []
+            _current.job = None
+
+    def shutdown(self, wait=True, cancel=False):
+        """Stop accepting jobs; cancel=True drops queued jobs and kills running processes"""
+        if cancel:
+            with self.lock:
+                jobs = list(self.jobs)
+            for job in jobs:
+                job.cancel()
+        self.executor.shutdown(wait=wait)
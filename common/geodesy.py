@@ -0,0 +1,43 @@
+import numpy as np
+
+# WGS84
+WGS84_A = 6378137.0
+WGS84_F = 1.0 / 298.257223563
+WGS84_E2 = WGS84_F * (2.0 - WGS84_F)
+
+
+# chuyển tọa độ địa lý (độ, độ, mét) sang ECEF (mét), dùng được cho mảng numpy
+def llh_to_ecef(lat, lon, hgt):
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    sin_lat = np.sin(lat)
+    cos_lat = np.cos(lat)
+    v = WGS84_A / np.sqrt(1.0 - WGS84_E2 * sin_lat * sin_lat)
+    x = (v + hgt) * cos_lat * np.cos(lon)
+    y = (v + hgt) * cos_lat * np.sin(lon)
+    z = (v * (1.0 - WGS84_E2) + hgt) * sin_lat
+    return x, y, z
+
+
+# chuyển tọa độ ECEF sang ENU (mét) so với điểm gốc (lat0, lon0, hgt0)
+def ecef_to_enu(x, y, z, lat0, lon0, hgt0):
+    x0, y0, z0 = llh_to_ecef(lat0, lon0, hgt0)
+    dx = np.asarray(x) - x0
+    dy = np.asarray(y) - y0
+    dz = np.asarray(z) - z0
+
+    lat0 = np.radians(lat0)
+    lon0 = np.radians(lon0)
+    sin_lat, cos_lat = np.sin(lat0), np.cos(lat0)
+    sin_lon, cos_lon = np.sin(lon0), np.cos(lon0)
+
+    e = -sin_lon * dx + cos_lon * dy
+    n = -sin_lat * cos_lon * dx - sin_lat * sin_lon * dy + cos_lat * dz
+    u = cos_lat * cos_lon * dx + cos_lat * sin_lon * dy + sin_lat * dz
+    return e, n, u
+
+
+# chuyển tọa độ địa lý sang ENU so với điểm gốc
+def llh_to_enu(lat, lon, hgt, lat0, lon0, hgt0):
+    x, y, z = llh_to_ecef(lat, lon, hgt)
+    return ecef_to_enu(x, y, z, lat0, lon0, hgt0)
@@ -35,6 +35,39 @@ def check_file_name_exists_in_dir(file_name, dir):
     return os.path.exists(os.path.join(dir, file_name))
 
 
+# xóa các mục cũ nhất (theo mtime) trong thư mục cache tới khi tổng dung lượng <= max_bytes
+# các file có cùng tên gốc (phần trước dấu chấm đầu tiên) được tính là một mục
+def evict_lru_files(dir, max_bytes):
+    if not os.path.exists(dir):
+        return
+    entries = {}
+    with os.scandir(dir) as scan:
+        for entry in scan:
+            # file của tiến trình khác đang ghi dở, hoặc vừa bị tiến trình khác xóa
+            if not entry.is_file() or entry.name.endswith(".tmp"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            key = entry.name.split(".")[0]
+            size, mtime, paths = entries.get(key, (0, 0, []))
+            entries[key] = (size + stat.st_size, max(mtime, stat.st_mtime), paths + [entry.path])
+
+    total_size = sum(size for size, _, _ in entries.values())
+    for size, _, paths in sorted(entries.values(), key=lambda item: item[1]):
+        if total_size <= max_bytes:
+            break
+        try:
+            for path in paths:
+                remove_file(path)
+            total_size -= size
+        except FileNotFoundError:
+            total_size -= size
+        except OSError as e:
+            print('-> Failed to evict %s. Reason: %s' % (paths[0], e))
+
+
 class Signal:
     """A class that mimics PyQt's signal functionality"""
     def __init__(self):
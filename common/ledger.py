@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import threading
+import time
+
+
+def get_fingerprint(path):
+    """size:mtime_ns of a file, a re-downloaded or rewritten file gets a new fingerprint"""
+    stat = os.stat(path)
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+class ProcessingLedger:
+    """
+    One SQLite ledger for the artifacts of every stage: "fetch" (remote files),
+    "convert" (TPS files), "solve" (.pos files of an input group) and "aggregate".
+    Each (stage, path) row keeps the status, the fingerprint of the artifact when it
+    was processed and the timings. An artifact is pending when it has no row, its last
+    run did not finish with "done", or its fingerprint changed since. Local files are
+    fingerprinted with get_fingerprint; remote files and input groups pass their own.
+    The connection is shared by the pipeline threads behind a lock.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path.replace("\\", "/")
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS artifacts ("
+                "stage TEXT, path TEXT, status TEXT, fingerprint TEXT, "
+                "started REAL, finished REAL, duration REAL, error TEXT, "
+                "PRIMARY KEY (stage, path)"
+                ") WITHOUT ROWID"
+            )
+            self.connection.execute("CREATE INDEX IF NOT EXISTS artifacts_status ON artifacts (stage, status)")
+            # directories whose legacy "last file" log was already imported
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS seeded (stage TEXT, scope TEXT, PRIMARY KEY (stage, scope))"
+            )
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def seed_from_last_path(self, stage, scope, paths, last_path):
+        """
+        Import a legacy tpsprocess.txt/posprocess.txt checkpoint once per (stage, scope):
+        every path up to last_path counts as done with its current fingerprint.
+        """
+        with self.lock, self.connection:
+            if self.connection.execute(
+                "SELECT 1 FROM seeded WHERE stage = ? AND scope = ?", (stage, scope)
+            ).fetchone():
+                return
+            if last_path:
+                now = time.time()
+                rows = []
+                for path in paths:
+                    if path.replace("\\", "/") <= last_path.replace("\\", "/") and os.path.exists(path):
+                        rows.append((stage, path.replace("\\", "/"), "done", get_fingerprint(path), None, now, None, None))
+                self.connection.executemany(
+                    "INSERT OR IGNORE INTO artifacts VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows
+                )
+            self.connection.execute("INSERT INTO seeded VALUES (?, ?)", (stage, scope))
+
+    def get_pending(self, stage, paths):
+        """The paths of a stage that still need processing, sorted"""
+        candidates = []
+        for path in paths:
+            try:
+                candidates.append((path, get_fingerprint(path)))
+            except OSError:
+                # removed while listing
+                continue
+        return self.get_pending_fingerprints(stage, candidates)
+
+    def get_pending_fingerprints(self, stage, candidates):
+        """get_pending for (path, fingerprint) pairs whose fingerprint is not a local file stat"""
+        candidates = [(path.replace("\\", "/"), fingerprint) for path, fingerprint in candidates]
+        with self.lock, self.connection:
+            self.connection.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS candidates (path TEXT PRIMARY KEY, fingerprint TEXT)"
+            )
+            self.connection.execute("DELETE FROM candidates")
+            self.connection.executemany("INSERT OR REPLACE INTO candidates VALUES (?, ?)", candidates)
+            rows = self.connection.execute(
+                "SELECT c.path FROM candidates c "
+                "LEFT JOIN artifacts a ON a.stage = ? AND a.path = c.path "
+                "WHERE a.path IS NULL OR a.status != 'done' OR a.fingerprint != c.fingerprint "
+                "ORDER BY c.path",
+                (stage,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def record(self, stage, path, status, started=None, error=None, fingerprint=None):
+        """
+        Store the outcome of processing path; started is a time.time() value.
+        Without fingerprint the current one of the local file path is stored.
+        """
+        finished = time.time()
+        duration = finished - started if started else None
+        if fingerprint is None:
+            try:
+                fingerprint = get_fingerprint(path)
+            except OSError:
+                pass
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO artifacts VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT (stage, path) DO UPDATE SET status = excluded.status, "
+                "fingerprint = excluded.fingerprint, started = excluded.started, "
+                "finished = excluded.finished, duration = excluded.duration, error = excluded.error",
+                (stage, path.replace("\\", "/"), status, fingerprint, started, finished, duration, error)
+            )
+
+    def get_summary(self, stage=None):
+        """{(stage, status): count}"""
+        query = "SELECT stage, status, COUNT(*) FROM artifacts"
+        params = ()
+        if stage:
+            query += " WHERE stage = ?"
+            params = (stage,)
+        query += " GROUP BY stage, status"
+        with self.lock:
+            return {(row[0], row[1]): row[2] for row in self.connection.execute(query, params)}
@@ -10,8 +10,6 @@ RNX2RTKP_CONFIG_FILE = config_json["rnx2rtkp_config_file"]
 LOGGING = config_json["logging"]
 
 FTP_BASE_SETTINGS = config_json["ftp"]["base"]
-FTP_ROVERS1_SETTINGS = config_json["ftp"]["rovers1"]
-FTP_ROVERS2_SETTINGS = config_json["ftp"]["rovers2"]
 
 DATA_INTERVAL = config_json["data"]["interval"]
 DATA_Q_VALUES = config_json["data"]["q_values"]
@@ -19,15 +17,73 @@ DATA_THRESHOLD = config_json["data"]["threshold"]
 DATA_THRESHOLD_DELTA_X = config_json["data"]["threshold_delta_x"]
 DATA_THRESHOLD_DELTA_Y = config_json["data"]["threshold_delta_y"]
 DATA_THRESHOLD_DELTA_Z = config_json["data"]["threshold_delta_z"]
+DATA_ENGINE = config_json["data"].get("engine", "python")
+DATA_CACHE_MAX_MB = config_json["data"].get("cache_max_mb", 512)
+DATA_BINNED = config_json["data"].get("binned", False)
+DATA_AGGREGATION_WORKERS = config_json["data"].get("aggregation_workers", 1)
+DATA_FOLLOW_POLL_SECONDS = config_json["data"].get("follow_poll_seconds", 2)
+DATA_MERGE_MAX_LAG_SECONDS = config_json["data"].get("merge_max_lag_seconds", 3600)
+DATA_RESULT_STORE = config_json["data"].get("result_store", "csv")
 DATA_BASE_LAT = config_json["data"]["base"]["lat"]
 DATA_BASE_LON = config_json["data"]["base"]["lon"]
 DATA_BASE_HGT = config_json["data"]["base"]["hgt"]
-DATA_ROVER1_EAST = config_json["data"]["rover1"]["east"]
-DATA_ROVER1_NORTH = config_json["data"]["rover1"]["north"]
-DATA_ROVER1_UP = config_json["data"]["rover1"]["up"]
-DATA_ROVER2_EAST = config_json["data"]["rover2"]["east"]
-DATA_ROVER2_NORTH = config_json["data"]["rover2"]["north"]
-DATA_ROVER2_UP = config_json["data"]["rover2"]["up"]
+
+# danh sách rover: mỗi rover gồm tên, danh sách cấu hình ftp, tọa độ ENU tham chiếu và tên cột output
+# cấu hình cũ (ftp.rovers1/rovers2 + data.rover1/rover2) vẫn được đọc nếu chưa khai báo "rovers"
+if "rovers" in config_json:
+    ROVERS = config_json["rovers"]
+else:
+    ROVERS = [
+        {
+            "name": f"Rover{i}",
+            "ftp": config_json["ftp"][f"rovers{i}"],
+            "east": config_json["data"][f"rover{i}"]["east"],
+            "north": config_json["data"][f"rover{i}"]["north"],
+            "up": config_json["data"][f"rover{i}"]["up"],
+        }
+        for i in (1, 2) if f"rovers{i}" in config_json["ftp"]
+    ]
+for i, rover in enumerate(ROVERS, 1):
+    rover.setdefault("columns", [f"Delta_E{i}(mm)", f"Delta_N{i}(mm)", f"Delta_U{i}(mm)"])
+
+# tên cũ cho hai rover đầu tiên
+FTP_ROVERS1_SETTINGS = ROVERS[0]["ftp"] if len(ROVERS) > 0 else []
+FTP_ROVERS2_SETTINGS = ROVERS[1]["ftp"] if len(ROVERS) > 1 else []
+DATA_ROVER1_EAST, DATA_ROVER1_NORTH, DATA_ROVER1_UP = (
+    (ROVERS[0]["east"], ROVERS[0]["north"], ROVERS[0]["up"]) if len(ROVERS) > 0 else (None, None, None)
+)
+DATA_ROVER2_EAST, DATA_ROVER2_NORTH, DATA_ROVER2_UP = (
+    (ROVERS[1]["east"], ROVERS[1]["north"], ROVERS[1]["up"]) if len(ROVERS) > 1 else (None, None, None)
+)
+
+PIPELINE_SETTINGS = config_json.get("pipeline", {})
+PIPELINE_MODE = PIPELINE_SETTINGS.get("mode", "sequential")
+PIPELINE_WORKERS = PIPELINE_SETTINGS.get("workers", 4)
+PIPELINE_STREAMING = PIPELINE_SETTINGS.get("streaming", False)
+PIPELINE_QUEUE_SIZE = PIPELINE_SETTINGS.get("queue_size", 4)
+PIPELINE_CONVERT_WORKERS = PIPELINE_SETTINGS.get("convert_workers", 2)
+PIPELINE_WATCH_POLL_SECONDS = PIPELINE_SETTINGS.get("watch_poll_seconds", 5)
+PIPELINE_WATCH_SETTLE_SECONDS = PIPELINE_SETTINGS.get("watch_settle_seconds", 2)
+PIPELINE_LEDGER = PIPELINE_SETTINGS.get("ledger", False)
+# 0: một solver cho mỗi CPU / không giới hạn thời gian
+PIPELINE_SOLVER_WORKERS = PIPELINE_SETTINGS.get("solver_workers", 0)
+PIPELINE_SOLVER_TIMEOUT = PIPELINE_SETTINGS.get("solver_timeout", 0)
+# cache kết quả rnx2rtkp theo nội dung file đầu vào, cấu hình và bản build; false để luôn chạy lại
+PIPELINE_SOLVE_CACHE = PIPELINE_SETTINGS.get("solve_cache", True)
+PIPELINE_SOLVE_CACHE_MAX_MB = PIPELINE_SETTINGS.get("solve_cache_max_mb", 1024)
+# chia một file obs thành nhiều đoạn thời gian (-ts/-te) giải song song rồi ghép lại; 1: tắt
+# mỗi đoạn là một tiến trình rnx2rtkp trong cùng một job của solver executor
+PIPELINE_SOLVE_SLICES = PIPELINE_SETTINGS.get("solve_slices", 1)
+PIPELINE_SLICE_OVERLAP_SECONDS = PIPELINE_SETTINGS.get("slice_overlap_seconds", 300)
+
+# cách chạy rnx2rtkp/tps2rin: "auto" (windows trên Windows, native trên Linux), "windows", "native" hoặc "fake"
+# đường dẫn rỗng: dùng file mặc định của backend
+BACKEND_SETTINGS = config_json.get("backend", {})
+BACKEND_NAME = BACKEND_SETTINGS.get("name", "auto")
+BACKEND_RNX2RTKP = BACKEND_SETTINGS.get("rnx2rtkp", "")
+BACKEND_TPS2RIN = BACKEND_SETTINGS.get("tps2rin", "")
 
 BASE_DATA_DIR = os.path.join(DATA_DIR, FTP_BASE_SETTINGS["local_dir"] + "/raw")
 BASE_DATA_DIR_PROCESSED = os.path.join(DATA_DIR, FTP_BASE_SETTINGS["local_dir"] + "/process")
+# thư mục tạm của các job rnx2rtkp, nằm trong data để hard link tới file đầu vào không phải vượt ổ đĩa
+JOBS_DIR = os.path.join(DATA_DIR, ".jobs")
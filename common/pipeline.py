@@ -0,0 +1,98 @@
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+
+class Pipeline:
+    """
+    Run named stages as a dependency graph.
+    A stage starts as soon as all of its dependencies finished successfully, and
+    independent stages run concurrently on a bounded thread pool. Stages that share
+    a lock name never run at the same time. When a stage fails, everything that
+    depends on it is skipped while unrelated branches keep running.
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max(1, max_workers)
+        self.stages = {}
+        self.locks = {}
+        self.results = {}
+
+    def add_stage(self, name, func, depends_on=(), lock=None):
+        """Declare a stage; stages are started in declaration order when several are ready"""
+        for dependency in depends_on:
+            if dependency not in self.stages:
+                raise ValueError(f"Stage {name} depends on unknown stage {dependency}")
+        self.stages[name] = {"func": func, "depends_on": list(depends_on), "lock": lock}
+        if lock:
+            self.locks.setdefault(lock, threading.Lock())
+
+    def get_downstream(self, names):
+        """The given stages and every stage that depends on them, directly or not"""
+        selected = set(names)
+        for name, stage in self.stages.items():
+            # stages can only depend on stages declared before them
+            if any(dependency in selected for dependency in stage["depends_on"]):
+                selected.add(name)
+        return selected
+
+    def _run_stage(self, name):
+        stage = self.stages[name]
+        lock = self.locks.get(stage["lock"])
+        if lock:
+            lock.acquire()
+        start = time.perf_counter()
+        try:
+            print(f"-> Stage {name} started")
+            value = stage["func"]()
+            return value, time.perf_counter() - start
+        finally:
+            if lock:
+                lock.release()
+
+    def run(self, stages=None):
+        """
+        Run all stages and return {name: {"status", "duration", "value", "error"}}.
+        status is one of "done", "failed" or "skipped".
+        If stages is given, only those stages and their downstream stages run; the
+        others are reported as "idle" and count as satisfied dependencies.
+        """
+        self.results = {}
+        pending = list(self.stages)
+        if stages is not None:
+            selected = self.get_downstream(stages)
+            for name in list(pending):
+                if name not in selected:
+                    pending.remove(name)
+                    self.results[name] = {"status": "idle", "duration": 0.0, "value": None, "error": None}
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending or running:
+                for name in list(pending):
+                    dependencies = self.stages[name]["depends_on"]
+                    if any(self.results.get(d, {}).get("status") in ("failed", "skipped") for d in dependencies):
+                        pending.remove(name)
+                        self.results[name] = {"status": "skipped", "duration": 0.0, "value": None, "error": None}
+                        print(f"-> Stage {name} skipped")
+                        continue
+                    if len(running) >= self.max_workers:
+                        break
+                    if all(self.results.get(d, {}).get("status") in ("done", "idle") for d in dependencies):
+                        pending.remove(name)
+                        running[executor.submit(self._run_stage, name)] = name
+
+                if not running:
+                    continue
+
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        value, duration = future.result()
+                        self.results[name] = {"status": "done", "duration": duration, "value": value, "error": None}
+                        print(f"-> Stage {name} done in {duration:.1f}s")
+                    except Exception as e:
+                        self.results[name] = {"status": "failed", "duration": 0.0, "value": None, "error": str(e)}
+                        print(f"-> Stage {name} failed: {e}")
+        return self.results
@@ -0,0 +1,79 @@
+import os
+import shutil
+import tempfile
+import threading
+
+# linux/fs.h: _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+
+def _reflink(src, dst):
+    """Copy-on-write clone (btrfs, xfs, ...), False when not supported"""
+    try:
+        import fcntl
+    except ImportError:
+        return False
+    try:
+        with open(src, "rb") as src_file, open(dst, "wb") as dst_file:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+        return True
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+
+
+def stage_file(src, dst):
+    """
+    Make src available at dst without copying data when possible:
+    hard link, then symlink, then reflink, and only then a real copy.
+    Returns the method that was used.
+    """
+    src = os.path.abspath(src)
+    try:
+        os.link(src, dst)
+        return "hardlink"
+    except (OSError, AttributeError):
+        pass
+    try:
+        os.symlink(src, dst)
+        return "symlink"
+    except (OSError, NotImplementedError, AttributeError):
+        pass
+    if _reflink(src, dst):
+        return "reflink"
+    shutil.copyfile(src, dst)
+    return "copy"
+
+
+class StagingArea:
+    """
+    Inputs shared by many jobs of one cycle (the base obs/nav files used by
+    every rover), staged once into a temporary directory. Jobs stage from
+    these files, so a copy fallback happens once per cycle and not once per job.
+    The directory is created in parent_dir, which should be on the same volume
+    as the inputs and the job directories, or the hard links cannot be made.
+    """
+
+    def __init__(self, parent_dir=None):
+        if parent_dir:
+            os.makedirs(parent_dir, exist_ok=True)
+        self.root = tempfile.mkdtemp(prefix="gnss_stage_", dir=parent_dir)
+        self.files = {}
+        self.lock = threading.Lock()
+
+    def stage(self, path):
+        """Staged path of path, staging it on first use"""
+        src = os.path.abspath(path)
+        stat = os.stat(src)
+        key = (src, stat.st_size, stat.st_mtime_ns)
+        with self.lock:
+            if key not in self.files:
+                dst = os.path.join(self.root, f"{len(self.files)}_{os.path.basename(src)}")
+                stage_file(src, dst)
+                self.files[key] = dst
+            return self.files[key]
+
+    def cleanup(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+        self.files = {}
@@ -0,0 +1,149 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import time
+
+# inotify (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = 0o2000000
+INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class PollingWatcher:
+    """
+    Detect new or rewritten files in a set of directories by comparing
+    (size, mtime) snapshots every poll_seconds. Deleted files are ignored.
+    """
+
+    def __init__(self, dir_paths, poll_seconds=5):
+        self.dir_paths = list(dir_paths)
+        self.poll_seconds = poll_seconds
+        self.snapshots = {dir_path: self._snapshot(dir_path) for dir_path in self.dir_paths}
+
+    def _snapshot(self, dir_path):
+        snapshot = {}
+        if not os.path.isdir(dir_path):
+            return snapshot
+        with os.scandir(dir_path) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    snapshot[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def read_changes(self, timeout):
+        """Wait up to timeout seconds and return the set of directories with new or changed files"""
+        deadline = time.monotonic() + timeout
+        while True:
+            changed = set()
+            for dir_path in self.dir_paths:
+                snapshot = self._snapshot(dir_path)
+                previous = self.snapshots[dir_path]
+                if any(previous.get(name) != value for name, value in snapshot.items()):
+                    changed.add(dir_path)
+                self.snapshots[dir_path] = snapshot
+            remaining = deadline - time.monotonic()
+            if changed or remaining <= 0:
+                return changed
+            time.sleep(min(self.poll_seconds, remaining))
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    Linux inotify through ctypes. A directory changes when a file in it is
+    closed after writing or moved into it, so partially written files do not count.
+    """
+
+    def __init__(self, dir_paths):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self.dir_paths = {}
+        for dir_path in dir_paths:
+            os.makedirs(dir_path, exist_ok=True)
+            wd = libc.inotify_add_watch(self.fd, os.fsencode(dir_path), IN_CLOSE_WRITE | IN_MOVED_TO)
+            if wd < 0:
+                error = ctypes.get_errno()
+                os.close(self.fd)
+                raise OSError(error, f"inotify_add_watch failed for {dir_path}")
+            self.dir_paths[wd] = dir_path
+
+    def read_changes(self, timeout):
+        """Wait up to timeout seconds and return the set of directories with new or changed files"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        changed = set()
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, name_len = INOTIFY_EVENT.unpack_from(data, offset)
+                offset += INOTIFY_EVENT.size + name_len
+                if wd in self.dir_paths:
+                    changed.add(self.dir_paths[wd])
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+class DirectoryWatcher:
+    """
+    Report which of the watched directories received files. Uses inotify on
+    Linux and falls back to polling elsewhere or when inotify is unavailable.
+    Changes are debounced: after the first change, further changes are collected
+    until the directories have been quiet for settle_seconds.
+    """
+
+    def __init__(self, dir_paths, poll_seconds=5, settle_seconds=2):
+        self.settle_seconds = settle_seconds
+        dir_paths = [os.path.normpath(dir_path) for dir_path in dir_paths]
+        self.backend = None
+        if hasattr(select, "select") and os.name == "posix" and os.uname().sysname == "Linux":
+            try:
+                self.backend = InotifyWatcher(dir_paths)
+            except (OSError, AttributeError) as e:
+                print(f"-> inotify unavailable, polling instead: {e}")
+        if self.backend is None:
+            self.backend = PollingWatcher(dir_paths, poll_seconds)
+
+    def wait(self, timeout=None):
+        """
+        Block until some directories changed (or timeout seconds passed) and
+        return the set of changed directories.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            remaining = 3600 if deadline is None else deadline - time.monotonic()
+            if remaining <= 0:
+                return set()
+            changed = self.backend.read_changes(remaining)
+            if changed:
+                break
+
+        while True:
+            more = self.backend.read_changes(self.settle_seconds)
+            if not more:
+                return changed
+            changed |= more
+
+    def drain(self):
+        """Return the changes that happened so far without waiting"""
+        return self.backend.read_changes(0)
+
+    def close(self):
+        self.backend.close()
@@ -235,19 +235,15 @@ class DeviceSelectionDialog(ctk.CTkToplevel):
                 options.append(self.device_db["ftp"]["base"]["local_dir"])
             
             # Add Rovers
-            if "rovers1" in self.device_db["ftp"]:
-                for rover in self.device_db["ftp"]["rovers1"]:
-                    options.append(rover["local_dir"])
-            if "rovers2" in self.device_db["ftp"]:
-                for rover in self.device_db["ftp"]["rovers2"]:
-                    options.append(rover["local_dir"])
+            for rover in cfg.ROVERS:
+                for settings in rover["ftp"]:
+                    options.append(settings["local_dir"])
         
         # Add combinations
         if "base" in self.device_db["ftp"]:
-            if "rovers1" in self.device_db["ftp"]:
-                options.append(f"{self.device_db['ftp']['base']['local_dir']} + {self.device_db['ftp']['rovers1'][0]['local_dir']}")
-            if "rovers2" in self.device_db["ftp"]:
-                options.append(f"{self.device_db['ftp']['base']['local_dir']} + {self.device_db['ftp']['rovers2'][0]['local_dir']}")
+            for rover in cfg.ROVERS:
+                if rover["ftp"]:
+                    options.append(f"{self.device_db['ftp']['base']['local_dir']} + {rover['ftp'][0]['local_dir']}")
         
         return options
         
@@ -377,20 +373,18 @@ class DeviceSelectionDialog(ctk.CTkToplevel):
         try:
             if selected_device == "All":
                 self.download_base_data(start_date, start_time)
-                self.download_rover_data(cfg.FTP_ROVERS1_SETTINGS, start_date, start_time)
-                self.download_rover_data(cfg.FTP_ROVERS2_SETTINGS, start_date, start_time)
-            elif selected_device == "Base":
-                self.download_base_data(start_date, start_time)
-            elif selected_device == "Rover1":
-                self.download_rover_data(cfg.FTP_ROVERS1_SETTINGS, start_date, start_time)
-            elif selected_device == "Rover2":
-                self.download_rover_data(cfg.FTP_ROVERS2_SETTINGS, start_date, start_time)
-            elif selected_device == "Base+Rover1":
-                self.download_base_data(start_date, start_time)
-                self.download_rover_data(cfg.FTP_ROVERS1_SETTINGS, start_date, start_time)
-            elif selected_device == "Base+Rover2":
-                self.download_base_data(start_date, start_time)
-                self.download_rover_data(cfg.FTP_ROVERS2_SETTINGS, start_date, start_time)     
+                for rover in cfg.ROVERS:
+                    self.download_rover_data(rover["ftp"], start_date, start_time)
+            else:
+                # "Base", "<rover local_dir>" or "Base + <rover local_dir>"
+                for device in [name.strip() for name in selected_device.split("+")]:
+                    if device == cfg.FTP_BASE_SETTINGS["local_dir"]:
+                        self.download_base_data(start_date, start_time)
+                        continue
+                    for rover in cfg.ROVERS:
+                        settings_list = [settings for settings in rover["ftp"] if settings["local_dir"] == device]
+                        if settings_list:
+                            self.download_rover_data(settings_list, start_date, start_time)
         except Exception as e:
             self.error_signal.emit(f"Error during data fetching: {str(e)}")
             err = "Cannot connect to device"
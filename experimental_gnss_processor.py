@@ -1,6 +1,5 @@
 import json
 import os
-import time
 from importlib import reload
 from multiprocessing.pool import ThreadPool
 
@@ -161,7 +160,6 @@ class GNSSProcessor:
                           data_rover_east, data_rover_north, data_rover_up):
         self.rtkpos = RTKPos(local_dir)
         self.rtkpos.create_output_file(output_file_path)
-        time.sleep(1)
         rtkp_output_log_path = os.path.join(local_dir, "posprocess.txt")
         rtkp_output_file_paths = self.rtkpos.get_unprocessed_rtkp_output_file_paths(
             output_dir,
@@ -0,0 +1,133 @@
+import os
+import shutil
+import sys
+
+import common.parser as cfg
+
+MODULES_DIR = os.path.split(os.path.abspath(__file__))[0].replace("\\", "/")
+
+
+class SolverBackend:
+    """
+    How rnx2rtkp and tps2rin are started on this machine: which executables, and
+    their command lines as argument lists. Nothing runs through a shell, so the
+    process the executor kills on a timeout or cancel is the tool itself.
+    The processors build their commands through the backend and run them with
+    common.completion, so the same pipeline runs on the field PC, on a Linux box
+    with native builds, or with the fake tools for tests and benchmarks.
+    """
+    name = None
+
+    def get_rnx2rtkp_path(self):
+        """File that identifies the solver build (part of the solve cache key)"""
+        raise NotImplementedError
+
+    def get_rnx2rtkp_command(self, config_file, options, output_file, input_files):
+        raise NotImplementedError
+
+    def get_tps2rin_command(self, tps_file_path, output_dir):
+        raise NotImplementedError
+
+
+class WindowsBackend(SolverBackend):
+    """
+    rnx2rtkp.exe and tps2rin.exe shipped in modules/, started directly with an argument
+    list (no cmd.exe in between), so a timeout or cancel kills the tool itself
+    """
+    name = "windows"
+
+    def get_rnx2rtkp_path(self):
+        return cfg.BACKEND_RNX2RTKP or f"{MODULES_DIR}/rnx2rtkp.exe"
+
+    def get_rnx2rtkp_command(self, config_file, options, output_file, input_files):
+        return [self.get_rnx2rtkp_path(), "-k", config_file] + list(options) + ["-o", output_file] + list(input_files)
+
+    def get_tps2rin_command(self, tps_file_path, output_dir):
+        bin_file = cfg.BACKEND_TPS2RIN or f"{MODULES_DIR}/tps2rin.exe"
+        return [bin_file, "-i", tps_file_path, "-o", output_dir]
+
+
+class NativeBackend(SolverBackend):
+    """
+    Native builds run as argument lists, e.g. RTKLIB rnx2rtkp compiled on Linux.
+    Executables come from backend.rnx2rtkp/backend.tps2rin, then PATH, then modules/.
+    tps2rin has no native build, so without one the Windows tps2rin.exe runs under wine.
+    """
+    name = "native"
+
+    def _find(self, configured, name):
+        if configured:
+            return configured
+        found = shutil.which(name)
+        if found:
+            return found
+        local_path = f"{MODULES_DIR}/{name}"
+        if os.path.exists(local_path):
+            return local_path
+        return None
+
+    def get_rnx2rtkp_path(self):
+        bin_file = self._find(cfg.BACKEND_RNX2RTKP, "rnx2rtkp")
+        if bin_file is None:
+            raise FileNotFoundError("rnx2rtkp not found, set backend.rnx2rtkp in device_db.json")
+        return bin_file
+
+    def get_rnx2rtkp_command(self, config_file, options, output_file, input_files):
+        return [self.get_rnx2rtkp_path(), "-k", config_file] + list(options) + ["-o", output_file] + list(input_files)
+
+    def get_tps2rin_command(self, tps_file_path, output_dir):
+        bin_file = self._find(cfg.BACKEND_TPS2RIN, "tps2rin")
+        if bin_file is not None:
+            return [bin_file, "-i", tps_file_path, "-o", output_dir]
+        wine = shutil.which("wine")
+        if wine is None:
+            raise FileNotFoundError("tps2rin not found and wine is not installed, set backend.tps2rin in device_db.json")
+        return [wine, f"{MODULES_DIR}/tps2rin.exe", "-i", tps_file_path, "-o", output_dir]
+
+
+class FakeBackend(SolverBackend):
+    """
+    modules/fakebin.py in place of both tools: deterministic RINEX-like files and
+    .pos solutions around the reference position of the rover, with the same
+    file names and command line options as the real tools.
+    """
+    name = "fake"
+    fakebin = f"{MODULES_DIR}/fakebin.py"
+
+    def get_rnx2rtkp_path(self):
+        return self.fakebin
+
+    def _get_reference(self, output_file):
+        """ENU reference of the rover whose local_dir is in output_file, the fake solutions are around it"""
+        parts = output_file.replace("\\", "/").split("/")
+        for rover in cfg.ROVERS:
+            if any(settings["local_dir"] in parts for settings in rover["ftp"]):
+                return rover["east"], rover["north"], rover["up"]
+        return 0.0, 0.0, 0.0
+
+    def get_rnx2rtkp_command(self, config_file, options, output_file, input_files):
+        reference = ",".join(str(value) for value in self._get_reference(output_file))
+        return (
+            [sys.executable, self.fakebin, "rnx2rtkp", "--reference", reference, "-k", config_file]
+            + list(options) + ["-o", output_file] + list(input_files)
+        )
+
+    def get_tps2rin_command(self, tps_file_path, output_dir):
+        return [sys.executable, self.fakebin, "tps2rin", "-i", tps_file_path, "-o", output_dir]
+
+
+BACKENDS = {
+    WindowsBackend.name: WindowsBackend,
+    NativeBackend.name: NativeBackend,
+    FakeBackend.name: FakeBackend,
+}
+
+
+def get_backend(name=None):
+    """Backend by name (backend.name in device_db.json); "auto" is windows on Windows, native elsewhere"""
+    name = name or cfg.BACKEND_NAME
+    if name == "auto":
+        name = WindowsBackend.name if os.name == "nt" else NativeBackend.name
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown backend: {name}, expected one of {', '.join(['auto'] + list(BACKENDS))}")
+    return BACKENDS[name]()
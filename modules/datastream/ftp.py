@@ -8,11 +8,17 @@ class FTPDownloader:
     def __init__(self, credentials, progress_signal=None, error_signal=None, status_signal=None):
         self.ftp = None
         self.credentials = credentials
-        self.progress_signal = progress_signal
-        self.error_signal = error_signal
-        self.status_signal = status_signal
+        # headless callers (GNSSProcessor) pass no signals, fall back to unconnected ones
+        self.progress_signal = progress_signal or Signal()
+        self.error_signal = error_signal or Signal()
+        self.status_signal = status_signal or Signal()
         self.last_activity = time.time()
         self.timeout = credentials.get("timeout", 60)  # Default 60 seconds timeout
+        # common.ledger.ProcessingLedger; when set it records every fetch and replaces
+        # the local file size check for finding new remote files
+        self.ledger = None
+        # "size:modify time" of the listed remote files, stored in the ledger after the download
+        self.remote_fingerprints = {}
         self.connect()
 
     def connect(self):
@@ -82,15 +88,18 @@ class FTPDownloader:
                 if not files:
                     return []
 
-                result = []
-                for file in files:
-                    local_file_path = os.path.join(local_dir, file)
-                    if os.path.exists(local_file_path) and os.path.getsize(local_file_path) > 2000:
-                        continue
-                    if file.startswith(prefix):
-                        result.append(os.path.join(remote_dir, file))
-                result.sort()
-                result = result[:-1] if result else []
+                if self.ledger is not None:
+                    result = self._get_pending_remote_files(remote_dir, prefix, local_dir, files)
+                else:
+                    result = []
+                    for file in files:
+                        local_file_path = os.path.join(local_dir, file)
+                        if os.path.exists(local_file_path) and os.path.getsize(local_file_path) > 2000:
+                            continue
+                        if file.startswith(prefix):
+                            result.append(os.path.join(remote_dir, file))
+                    result.sort()
+                    result = result[:-1] if result else []
                 self.status_signal.emit(f"Downloading {len(result)} files...")
                 return result
 
@@ -102,6 +111,67 @@ class FTPDownloader:
                 else:
                     return []
 
+    def get_ledger_key(self, remote_file_path):
+        """Ledger path of a remote file, the same remote path on another server is another file"""
+        remote_file_path = remote_file_path.replace("\\", "/")
+        return f"ftp://{self.credentials['host']}:{self.credentials['port']}/{remote_file_path.lstrip('/')}"
+
+    def get_remote_fingerprints(self, names):
+        """
+        {name: "size:modify time"} of files in the current remote directory, from one
+        MLSD listing or, on servers without it, from SIZE and MDTM per file.
+        None when the server reports neither; such files are only fetched once.
+        """
+        fingerprints = {}
+        try:
+            for name, facts in self.ftp.mlsd(facts=["size", "modify"]):
+                if "size" in facts or "modify" in facts:
+                    fingerprints[name] = f"{facts.get('size', '')}:{facts.get('modify', '')}"
+        except error_perm:
+            pass
+        for name in names:
+            if name in fingerprints:
+                continue
+            try:
+                size = self.ftp.size(name)
+                modify = self.ftp.sendcmd(f"MDTM {name}").split()[-1]
+                fingerprints[name] = f"{size}:{modify}"
+            except error_perm:
+                fingerprints[name] = None
+        self.last_activity = time.time()
+        return {name: fingerprints.get(name) for name in names}
+
+    def _get_pending_remote_files(self, remote_dir, prefix, local_dir, files):
+        """
+        Remote files the ledger has no finished fetch for, or that changed on the server
+        since. The newest file is left out, the receiver may still be writing it.
+        Files already downloaded before the ledger was turned on (a local file of the
+        same size) are recorded as fetched instead of being downloaded again.
+        """
+        names = sorted(file for file in files if file.startswith(prefix))[:-1]
+        fingerprints = self.get_remote_fingerprints(names)
+        remote_paths = {}
+        candidates = []
+        for name in names:
+            remote_path = os.path.join(remote_dir, name)
+            self.remote_fingerprints[remote_path] = fingerprints[name]
+            remote_paths[self.get_ledger_key(remote_path)] = remote_path
+            candidates.append((self.get_ledger_key(remote_path), fingerprints[name]))
+
+        result = []
+        for key in self.ledger.get_pending_fingerprints("fetch", candidates):
+            remote_path = remote_paths[key]
+            fingerprint = self.remote_fingerprints[remote_path]
+            local_file_path = os.path.join(local_dir, os.path.basename(remote_path))
+            if (
+                fingerprint is not None and os.path.exists(local_file_path)
+                and fingerprint.split(":")[0] == str(os.path.getsize(local_file_path))
+            ):
+                self.ledger.record("fetch", key, "done", fingerprint=fingerprint)
+                continue
+            result.append(remote_path)
+        return sorted(result)
+
     def generate_local_file_paths(self, local_dir, remote_file_paths, start_date=None, start_time=None):
         """Generate local file paths for downloads"""
         try:
@@ -123,12 +193,24 @@ class FTPDownloader:
             self.error_signal.emit(f"Error generating local paths: {e}")
             return []
 
-    def download_files(self, remote_file_paths, local_file_paths):
-        """Download multiple files with connection checking"""
+    def download_files(self, remote_file_paths, local_file_paths, completed_queue=None):
+        """
+        Download multiple files with connection checking.
+        If completed_queue is given, each successfully downloaded local path is put on it
+        as soon as it lands; a bounded queue makes the download wait for slow consumers.
+        """
         for remote_path, local_path in zip(remote_file_paths, local_file_paths):
             index = remote_file_paths.index(remote_path)
             if (not os.path.exists(local_path)) or (os.path.exists(local_path) and float(os.path.getsize(local_path))/1024**2 < 2000):
-                self.download_file_with_retry(index, remote_path, local_path)
+                started = time.time()
+                downloaded = self.download_file_with_retry(index, remote_path, local_path)
+                if self.ledger is not None:
+                    self.ledger.record(
+                        "fetch", self.get_ledger_key(remote_path), "done" if downloaded else "failed",
+                        started, fingerprint=self.remote_fingerprints.get(remote_path)
+                    )
+                if downloaded and completed_queue is not None:
+                    completed_queue.put(local_path)
                 if self.progress_signal:
                     self.progress_signal.emit(index/len(remote_file_paths))
             else:
@@ -141,7 +223,7 @@ class FTPDownloader:
             try:
                 self.check_connection()
                 self.download_file(index, remote_file_path, local_file_path)
-                return  # Success
+                return True  # Success
             except Exception as e:
                 self.error_signal.emit(f"-> Download attempt {attempt + 1}/{max_retries} failed: {e}")
                 if attempt < max_retries - 1:
@@ -149,6 +231,7 @@ class FTPDownloader:
                     time.sleep(2)  # Wait before retry
                 else:
                     self.error_signal.emit(f"-> Failed to download after {max_retries} attempts")
+        return False
 
     def download_file(self, index, remote_file_path, local_file_path):
         """Download single file with progress monitoring"""
@@ -0,0 +1,264 @@
+import heapq
+import json
+import os
+from datetime import datetime, timedelta
+
+import common.helpers as helpers
+
+OUTPUT_TIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class OutputMerger:
+    """
+    Incremental merge of the per-rover output.csv files into data/output.csv.
+    Each rover file is read from a byte offset checkpoint. The rows of a rover are
+    sorted by TIMESTAMP, and a repeated TIMESTAMP keeps its first row, like the
+    drop_duplicates of the pandas merge this replaces; the sorted rovers are then
+    outer-joined on TIMESTAMP with a streaming merge.
+    Rows are only merged up to the watermark, the oldest last timestamp among the
+    rovers, so a rover that is behind does not leave holes; the rows past it wait
+    in the merge state. A rover more than max_lag_seconds behind the newest one
+    stops holding the watermark back.
+    A row at or before the last merged timestamp is dropped when output.csv already
+    has that rover at that TIMESTAMP (an hour aggregated again). Otherwise it would
+    change rows already written (an hour that arrived late), and the merged output
+    is rebuilt instead of dropping it.
+    rovers: list of (columns, [output.csv paths])
+    """
+    def __init__(self, data_dir, rovers, max_lag_seconds=3600):
+        self.rovers = rovers
+        self.max_lag = timedelta(seconds=max_lag_seconds)
+        self.output_path = os.path.join(data_dir, "output.csv").replace("\\", "/")
+        self.state_path = os.path.join(data_dir, "mergestate.txt").replace("\\", "/")
+        self.headers = ["TIMESTAMP"] + [column for columns, _ in rovers for column in columns]
+
+    def _load_state(self):
+        """
+        Offsets per rover file, last seen timestamp per rover, rows past the watermark
+        per rover, last merged timestamp and output size
+        """
+        empty_state = {
+            "offsets": {}, "identities": {}, "last_seen": {}, "pending": {}, "last_timestamp": None,
+            "output_size": 0, "headers": self.headers,
+        }
+        if not helpers.check_files_exist([self.state_path, self.output_path]):
+            return empty_state
+        try:
+            with open(self.state_path, "r") as state_file:
+                state = json.load(state_file)
+        except Exception as e:
+            print(f"-> Error reading merge state: {e}")
+            return empty_state
+        # rovers or columns changed, the existing output no longer matches
+        if state.get("headers") != self.headers:
+            print("-> Output columns changed, rebuilding merged output")
+            return empty_state
+        state.setdefault("identities", {})
+        state.setdefault("pending", {})
+        return state
+
+    def _get_identity(self, file_path):
+        """
+        device:inode of file_path; a rover output.csv rewritten through a temp file and
+        os.replace (ResultStore.export_csv) gets a new one, and the offsets no longer apply
+        """
+        if not os.path.exists(file_path):
+            return None
+        stat = os.stat(file_path)
+        return f"{stat.st_dev}:{stat.st_ino}"
+
+    def _save_state(self, state):
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as state_file:
+            json.dump(state, state_file)
+        os.replace(tmp_path, self.state_path)
+
+    def _read_tail(self, file_path, offset):
+        """
+        Complete lines of file_path after offset as (timestamp, fields, end offset).
+        The header line is skipped when reading from the start.
+        Returns None when the offset no longer matches the file (it shrank, or the
+        line at the offset is not the start of a row), the merge has to resync.
+        """
+        rows = []
+        if not os.path.exists(file_path):
+            return rows
+        size = os.path.getsize(file_path)
+        if size < offset:
+            return None
+        with open(file_path, "rb") as file:
+            file.seek(offset)
+            data = file.read(size - offset)
+
+        position = offset
+        for line in data.splitlines(keepends=True):
+            if not line.endswith(b"\n"):
+                break
+            position += len(line)
+            fields = line.decode("utf-8", errors="replace").strip().split(",")
+            timestamp = fields[0].strip('"')
+            if timestamp == "TIMESTAMP" or not timestamp:
+                continue
+            try:
+                datetime.strptime(timestamp, OUTPUT_TIME_FORMAT)
+            except ValueError:
+                if offset and not rows:
+                    # the offset points into the middle of a row
+                    return None
+                print(f"-> Skipped row with bad timestamp in {file_path}: {timestamp}")
+                continue
+            rows.append((timestamp, [field.strip('"') for field in fields[1:]], position))
+        return rows
+
+    def _get_watermark(self, last_seen):
+        """Oldest last timestamp of the rovers that are not too far behind"""
+        times = {}
+        for name, ts in list(last_seen.items()):
+            try:
+                times[name] = datetime.strptime(ts, OUTPUT_TIME_FORMAT)
+            except (TypeError, ValueError):
+                # corrupt state, the rover sets it again with its next row
+                print(f"-> Ignoring bad last timestamp of rover {name}: {ts}")
+                del last_seen[name]
+        if not times:
+            return None
+        newest = max(times.values())
+        active = [time for time in times.values() if newest - time <= self.max_lag]
+        return min(active).strftime(OUTPUT_TIME_FORMAT)
+
+    def merge(self):
+        """Append the newly mergeable rows to output.csv, returns the number of rows appended"""
+        return self._merge(self._load_state())
+
+    def _merge(self, state):
+        last_timestamp = state["last_timestamp"]
+        rebuilding = last_timestamp is None
+
+        rover_rows = []
+        for index, (columns, file_paths) in enumerate(self.rovers):
+            # rows of earlier cycles come first, they are earlier in the rover files
+            rows = [tuple(row) for row in state["pending"].get(str(index), [])]
+            for file_path in file_paths:
+                identity = self._get_identity(file_path)
+                known_identity = state["identities"].get(file_path)
+                if not rebuilding and known_identity and identity != known_identity:
+                    print(f"-> {file_path} was rewritten, rebuilding merged output")
+                    return self.rebuild()
+                state["identities"][file_path] = identity
+                tail = self._read_tail(file_path, state["offsets"].get(file_path, 0))
+                if tail is None:
+                    if not rebuilding:
+                        print(f"-> {file_path} changed under the merge offset, rebuilding merged output")
+                        return self.rebuild()
+                    tail = self._read_tail(file_path, 0) or []
+                rows.extend((timestamp, fields) for timestamp, fields, _ in tail)
+                if tail:
+                    state["offsets"][file_path] = tail[-1][2]
+            rows = self._sort_rows(rows)
+            rover_rows.append(rows)
+            if rows:
+                newest = rows[-1][0]
+                state["last_seen"][str(index)] = max(newest, state["last_seen"].get(str(index), newest))
+
+        if not rebuilding:
+            late = {
+                index: {row[0] for row in rows if row[0] <= last_timestamp}
+                for index, rows in enumerate(rover_rows)
+            }
+            if any(late.values()):
+                if not self._is_merged(late):
+                    print("-> Late rows in the rover outputs, rebuilding merged output")
+                    return self.rebuild()
+                # already in output.csv, the first row of a rover for a timestamp wins
+                rover_rows = [[row for row in rows if row[0] > last_timestamp] for rows in rover_rows]
+
+        watermark = self._get_watermark(state["last_seen"])
+        if watermark is None:
+            return 0
+
+        streams = []
+        for index, rows in enumerate(rover_rows):
+            streams.append([(timestamp, index, fields) for timestamp, fields in rows if timestamp <= watermark])
+            state["pending"][str(index)] = [[timestamp, fields] for timestamp, fields in rows if timestamp > watermark]
+
+        lines = []
+        current_timestamp = None
+        current_row = None
+        for timestamp, index, fields in heapq.merge(*streams, key=lambda row: row[0]):
+            if timestamp != current_timestamp:
+                if current_row is not None:
+                    lines.append(self._format_row(current_timestamp, current_row))
+                current_timestamp = timestamp
+                current_row = {}
+            current_row[index] = fields
+        if current_row is not None:
+            lines.append(self._format_row(current_timestamp, current_row))
+
+        self._append_lines(state, lines)
+        if current_timestamp is not None:
+            state["last_timestamp"] = current_timestamp
+        state["headers"] = self.headers
+        self._save_state(state)
+        return len(lines)
+
+    def _sort_rows(self, rows):
+        """Rows of one rover sorted by timestamp, the first of the rows with the same timestamp kept"""
+        unique = {}
+        for timestamp, fields in rows:
+            unique.setdefault(timestamp, fields)
+        return sorted(unique.items())
+
+    def _is_merged(self, timestamps):
+        """
+        Whether output.csv already has a row of each rover at each of its timestamps
+        timestamps: {rover index: set of timestamps}
+        """
+        if not os.path.exists(self.output_path):
+            return False
+        starts = [1]
+        for columns, _ in self.rovers:
+            starts.append(starts[-1] + len(columns))
+        missing = {index: set(values) for index, values in timestamps.items() if values}
+        with open(self.output_path, "r", errors="replace") as output_file:
+            for line in output_file:
+                fields = line.rstrip("\n").split(",")
+                timestamp = fields[0].strip('"')
+                for index, values in missing.items():
+                    if timestamp in values and any(fields[starts[index]:starts[index + 1]]):
+                        values.discard(timestamp)
+        return not any(missing.values())
+
+    def _format_row(self, timestamp, row):
+        fields = [f'"{timestamp}"']
+        for index, (columns, _) in enumerate(self.rovers):
+            values = row.get(index, [])
+            fields.extend(values[i] if i < len(values) else "" for i in range(len(columns)))
+        return ",".join(fields) + "\n"
+
+    def _append_lines(self, state, lines):
+        """
+        Cut output.csv back to the size recorded with the last state, so an append
+        interrupted before its state was saved is not duplicated, then append
+        """
+        if not os.path.exists(self.output_path) or state["output_size"] == 0:
+            with open(self.output_path, "wb") as output_file:
+                output_file.write((",".join(self.headers) + "\n").encode("utf-8"))
+                output_file.flush()
+                state["output_size"] = output_file.tell()
+
+        with open(self.output_path, "r+b") as output_file:
+            output_file.truncate(state["output_size"])
+            output_file.seek(state["output_size"])
+            output_file.write("".join(lines).encode("utf-8"))
+            output_file.flush()
+            os.fsync(output_file.fileno())
+            state["output_size"] = output_file.tell()
+
+    def rebuild(self):
+        """
+        Forget the merge state and outer-join every rover file from the start; the
+        rows up to the watermark are written, the rest waits for the next merge
+        """
+        helpers.remove_file(self.state_path)
+        helpers.remove_file(self.output_path)
+        return self._merge(self._load_state())
@@ -1,34 +1,109 @@
+import functools
+import hashlib
+import io
 import json
 import os
 import re
 from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import common.geodesy as geodesy
 import common.parser as cfg
 import common.helpers as helpers
 
+POS_TIME_PATTERN = r"\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2}"
+POS_TIME_FORMAT = "%Y/%m/%d %H:%M:%S.%f"
+# "tuan GPS, giay trong tuan" o dau dong, vd "2355 270000.000 ..." hoac "2355,270000.000,..."
+POS_TOW_PATTERN = r"\s*\d{3,4}(\s+|[,;])\d+(\.\d+)?(\s+|[,;])"
+POS_TIME_OFFSET = timedelta(hours=8)
+# tang len khi doi cach parse de cache cu tu dong het hieu luc
+POS_PARSER_VERSION = 3
+POS_CACHE_DIR = "poscache"
+POS_TIME_SYSTEMS = ("GPST", "UTC", "JST")
+POS_COORDINATE_LABELS = {
+    "enu": "e-baseline",
+    "llh": "latitude(deg)",
+    "xyz": "x-ecef",
+}
+GPS_EPOCH = np.datetime64("1980-01-06T00:00:00", "us")
+# ket qua phan loai moi dong cua file pos (bad_timestamp gom ca cac dong header "%")
+POS_ROW_STATUSES = ("accepted", "bad_timestamp", "bad_q", "low_ns", "over_threshold")
+# cac cot dau cua file pos (ENU, phan cach bang dau phay): thoi gian, e, n, u, q, ns
+POS_RECORD_DTYPE = np.dtype([
+    ("time", "datetime64[us]"),
+    ("e", "f8"),
+    ("n", "f8"),
+    ("u", "f8"),
+    ("q", "i2"),
+    ("ns", "i2"),
+])
+
 class RTKPos:
-    def __init__(self, local_dir):
+    def __init__(self, local_dir, columns=None):
         self.local_dir = local_dir.replace("\\", "/")
-        if self.local_dir.split("/")[-1].startswith("Rover1"):
-            self.OUTPUT_FILE_HEADERS = ["TIMESTAMP", "Delta_E1(mm)", "Delta_N1(mm)", "Delta_U1(mm)"]
-        elif self.local_dir.split("/")[-1].startswith("Rover2"):
-            self.OUTPUT_FILE_HEADERS = ["TIMESTAMP", "Delta_E2(mm)", "Delta_N2(mm)", "Delta_U2(mm)"]
+        self.cache_dir = os.path.join(self.local_dir, POS_CACHE_DIR).replace("\\", "/")
+        # ten cot lay theo rover co local_dir trung voi thu muc nay (cfg.ROVERS)
+        if columns is None:
+            columns = self.get_rover_columns(self.local_dir.rstrip("/").split("/")[-1])
+        self.OUTPUT_FILE_HEADERS = ["TIMESTAMP"] + list(columns)
+        self.METRICS_FILE_HEADERS = ["FILE", "TIMESTAMP", "STATUS"] + [status.upper() for status in POS_ROW_STATUSES]
+
+    # ten cot output cua rover co local_dir trung dung ten thu muc (Rover1 khong khop Rover10)
+    def get_rover_columns(self, dir_name):
+        for rover in cfg.ROVERS:
+            if any(dir_name == settings["local_dir"] for settings in rover["ftp"]):
+                return rover["columns"]
+        return ["Delta_E(mm)", "Delta_N(mm)", "Delta_U(mm)"]
 
     # tao file output, neu file chua ton tai tao moi  them header cho file
-    def create_output_file(self, file_path):
+    def create_output_file(self, file_path, headers=None):
+        headers = headers or self.OUTPUT_FILE_HEADERS
         output_file_exists = os.path.exists(file_path)
         output_file = open(file_path, "a")
         if not output_file_exists or (output_file_exists and output_file.tell() == 0):
-            output_file.write(",".join(self.OUTPUT_FILE_HEADERS) + "\n")
+            output_file.write(",".join(headers) + "\n")
         output_file.close()
 
+    # ghi so dong theo tung ly do loai cua mot file pos vao file metrics (posmetrics.csv)
+    def write_metrics(self, metrics_file, file_path, result, counters):
+        if isinstance(result, list):
+            result = result[0]
+        if result:
+            status = "ok"
+        elif counters["bad_timestamp"] + counters["bad_q"] > sum(counters.values()) / 2:
+            status = "rejected_invalid"
+        else:
+            status = "rejected_empty"
+        row = [file_path.replace("\\", "/"), f'"{result["timestamp"]}"' if result else "", status]
+        row += [str(counters[name]) for name in POS_ROW_STATUSES]
+        metrics_file.write(",".join(row) + "\n")
+
+    # dat lai bo dem theo ly do (dict truyen vao se duoc ghi de)
+    def _init_counters(self, counters):
+        counters = {} if counters is None else counters
+        counters.update(dict.fromkeys(POS_ROW_STATUSES, 0))
+        return counters
+
     # lay cac file chua dc xu ly (chua tao thanh file pos) doi chieu qua file log
-    def get_unprocessed_rtkp_output_file_paths(self, output_dir, log_path):
+    def get_unprocessed_rtkp_output_file_paths(self, output_dir, log_path, ledger=None):
         file_paths = []
         with os.scandir(output_dir) as entries:
             for entry in entries:
                 if entry.is_file():
                     file_paths.append(os.path.join(output_dir, entry.name))
 
+        # ledger (common.ledger): file moi hoac da thay doi so voi lan xu ly truoc
+        if ledger is not None:
+            last_processed_file_path = None
+            if helpers.check_files_exist([log_path]):
+                with open(log_path, "r") as log_file:
+                    log_json = json.load(log_file)
+                    last_processed_file_path = log_json[0]["file_path"] if log_json else None
+            ledger.seed_from_last_path("aggregate", os.path.abspath(output_dir), file_paths, last_processed_file_path)
+            return ledger.get_pending("aggregate", file_paths)
+
         if not helpers.check_files_exist([log_path]):
             return file_paths
         
@@ -48,36 +123,49 @@ class RTKPos:
         except Exception as e:
             return file_paths
     
+    # chon ham tinh theo engine trong config: "python" (mac dinh), "vectorized", "streaming" hoac "cached"
+    # binned=True: tra ve ham chia epoch theo khoang DATA_INTERVAL (chi cho engine doc theo cot)
+    def get_engine(self, name, binned=False):
+        if binned:
+            readers = {
+                "vectorized": self.read_rtkp_output_records,
+                "cached": self.read_rtkp_output_records_cached,
+            }
+            if name not in readers:
+                raise ValueError(f"RTKPos engine {name} does not support binned aggregation")
+            return functools.partial(self.calculate_rtkp_output_bins, read_records=readers[name])
+
+        engines = {
+            "python": self.calculate_rtkp_output_file,
+            "vectorized": self.calculate_rtkp_output_file_vectorized,
+            "streaming": self.calculate_rtkp_output_file_streaming,
+            "cached": self.calculate_rtkp_output_file_cached,
+        }
+        if name not in engines:
+            raise ValueError(f"Unknown RTKPos engine: {name}")
+        return engines[name]
+
     # ham loai bo file co q ko dat yeu cau roi tinh gia tri trung binh
-    def calculate_rtkp_output_file(self, file_path, log_path, east, north, up):
+    # counters: dict (tuy chon) nhan so dong theo tung ly do trong POS_ROW_STATUSES
+    def calculate_rtkp_output_file(self, file_path, log_path, east, north, up, counters=None):
         file = open(file_path, "r")
         lines = file.readlines()
         file.close()
 
-        file_path = file_path.replace("\\", "/")
-        log_file = open(log_path, "w")
-        log_data = [
-            {
-                "file_path": file_path
-            }
-        ]
-        log_file.write(json.dumps(log_data))
-        log_file.close()
+        self.update_log(log_path, file_path)
 
         total_e = total_n = total_u = count = 0
         utc_time = datetime.min
 
         valid_line_data = []
-        invalid_q_counter = 0
+        counters = self._init_counters(counters)
         for line in lines:
-            is_q_valid = self.check_valid_q(line)
-            if not is_q_valid:
-                invalid_q_counter += 1
-
-            line_data = self.extract_valid_row(line, east, north, up)
+            status, line_data = self.classify_row(line, east, north, up)
+            counters[status] += 1
             if line_data:
                 valid_line_data.append(line_data)
 
+        invalid_q_counter = counters["bad_timestamp"] + counters["bad_q"]
         if invalid_q_counter > len(lines) / 2 or len(valid_line_data)==0:
             return None
 
@@ -89,14 +177,327 @@ class RTKPos:
             total_n += line_data["n"]
             total_u += line_data["u"]
 
+        return self._build_result(utc_time, total_e, total_n, total_u, count)
+
+    # ban vector hoa cua calculate_rtkp_output_file: doc ca file thanh cac cot mot lan
+    # roi loc q, ns, nguong bang mask; ket qua trung binh giong het ban python
+    def calculate_rtkp_output_file_vectorized(self, file_path, log_path, east, north, up, counters=None):
+        records, line_count = self.read_rtkp_output_records(file_path)
+        self.update_log(log_path, file_path)
+        return self._aggregate_records(records, line_count, east, north, up, counters)
+
+    # giong ban vector hoa nhung doc cot tu file cache nhi phan (.npy, memory-map) neu co,
+    # de doi q_values, threshold hay east/north/up ma khong phai parse lai file text
+    def calculate_rtkp_output_file_cached(self, file_path, log_path, east, north, up, counters=None):
+        records, line_count = self.read_rtkp_output_records_cached(file_path)
+        self.update_log(log_path, file_path)
+        return self._aggregate_records(records, line_count, east, north, up, counters)
+
+    # ban doc tuan tu: duyet file mot lan, chi giu tong va bo dem (bo nho O(1) cho moi file)
+    # van loai file khi hon mot nua so dong khong hop le
+    def calculate_rtkp_output_file_streaming(self, file_path, log_path, east, north, up, counters=None):
+        total_e = total_n = total_u = count = 0
+        last_time = None
+        counters = self._init_counters(counters)
+
+        with open(file_path, "r") as file:
+            for line in file:
+                status, line_data = self.classify_row(line, east, north, up)
+                counters[status] += 1
+                if not line_data:
+                    continue
+
+                last_time = line_data["utc_time"]
+                count += 1
+                total_e += line_data["e"]
+                total_n += line_data["n"]
+                total_u += line_data["u"]
+
+        self.update_log(log_path, file_path)
+
+        invalid_q_counter = counters["bad_timestamp"] + counters["bad_q"]
+        if invalid_q_counter > sum(counters.values()) / 2 or count == 0:
+            return None
+
+        return self._build_result(last_time, total_e, total_n, total_u, count)
+
+    # doc header "%" cua RTKLIB mot lan de biet dinh dang file:
+    # solformat (enu/llh/xyz), ky tu phan cach (None = khoang trang), timeform (hms/tow), timesys
+    # file khong co header thi coi nhu dinh dang cua s3.conf (enu, dau phay)
+    def read_rtkp_output_layout(self, text):
+        layout = {"solformat": "enu", "sep": ",", "timeform": "hms", "timesys": "GPST"}
+        for line in text.splitlines():
+            if not line.strip():
+                continue
+            if not line.startswith("%"):
+                # dong du lieu dau tien quyet dinh dang thoi gian, bo qua dong rac truoc no
+                if re.match(POS_TIME_PATTERN, line.lstrip()):
+                    break
+                if re.match(POS_TOW_PATTERN, line):
+                    layout["timeform"] = "tow"
+                    break
+                continue
+
+            labels = line[1:].split()
+            if not labels or labels[0] not in POS_TIME_SYSTEMS:
+                continue
+            # dong ten cot, vd: "%  GPST                  ,e-baseline(m),n-baseline(m),..."
+            layout["timesys"] = labels[0]
+            for solformat, label in POS_COORDINATE_LABELS.items():
+                if label in line:
+                    layout["solformat"] = solformat
+                    break
+            else:
+                raise ValueError(f"Unsupported RTKLIB solution format: {line.strip()}")
+            rest = line[1:].lstrip()[len(labels[0]):].lstrip(" ")
+            layout["sep"] = None if rest.startswith(tuple(POS_COORDINATE_LABELS.values())) else rest[0]
+        return layout
+
+    # doc file pos thanh mang cac cot (chi giu cac dong co thoi gian hop le)
+    # tra ve (records, tong so dong cua file); cot e/n/u luon la ENU (m) so voi tram base
+    def read_rtkp_output_records(self, file_path):
+        with open(file_path, "r") as file:
+            text = file.read()
+        line_count = text.count("\n") + (1 if text and not text.endswith("\n") else 0)
+
+        records = np.empty(0, dtype=POS_RECORD_DTYPE)
+        if not text.strip():
+            return records, line_count
+
+        layout = self.read_rtkp_output_layout(text)
+        # hms la 2 cot (ngay, gio) khi phan cach bang khoang trang; tow luon la 2 cot (tuan, giay)
+        time_columns = 1 if layout["timeform"] == "hms" and layout["sep"] else 2
+        # names + usecols: dong thieu cot duoc dien NaN, dong thua cot bi cat, dong rac thanh dong
+        # khong hop le va duoc dem qua line_count - len(records) nhu ban python
+        column_count = time_columns + 5
+        try:
+            frame = pd.read_csv(
+                io.StringIO(text),
+                sep=layout["sep"] or r"\s+",
+                header=None,
+                names=range(column_count),
+                usecols=range(column_count),
+                comment="%",
+                dtype=str,
+                skip_blank_lines=True,
+                on_bad_lines="skip",
+            )
+        except pd.errors.EmptyDataError:
+            # file chi co header (rnx2rtkp khong co nghiem)
+            return records, line_count
+        if frame.empty:
+            return records, line_count
+
+        parse_times = {
+            "hms": self._parse_hms_times,
+            "tow": self._parse_tow_times,
+        }[layout["timeform"]]
+        valid, epochs = parse_times(frame, time_columns)
+        if layout["timesys"] == "JST":
+            epochs = epochs - np.timedelta64(9, "h")
+
+        records = np.empty(np.count_nonzero(valid), dtype=POS_RECORD_DTYPE)
+        records["time"] = epochs
+        # float() tren tung chuoi (qua mang object) de giong het cach ban python parse so
+        coordinates = [
+            frame[index].to_numpy(dtype=object)[valid].astype(np.float64)
+            for index in range(time_columns, time_columns + 3)
+        ]
+        records["e"], records["n"], records["u"] = self._convert_to_enu(layout["solformat"], *coordinates)
+        for index, name in enumerate(("q", "ns"), start=time_columns + 3):
+            values = frame[index].to_numpy(dtype=object)[valid].astype(np.float64)
+            records[name] = np.nan_to_num(values, nan=-1).astype(np.int16)
+
+        return records[~np.isnat(records["time"])], line_count
+
+    # thoi gian dang "yyyy/mm/dd hh:mm:ss.sss" (1 cot, hoac 2 cot khi phan cach bang khoang trang)
+    def _parse_hms_times(self, frame, time_columns):
+        times = frame[0].to_numpy(dtype=object)
+        if time_columns == 2:
+            times = times + " " + frame[1].fillna("").to_numpy(dtype=object)
+        valid = pd.Series(times).str.match(POS_TIME_PATTERN, na=False).to_numpy(dtype=bool)
+        epochs = pd.to_datetime(
+            pd.Series(times[valid]), format=POS_TIME_FORMAT, errors="coerce"
+        ).to_numpy(dtype="datetime64[us]")
+        return valid, epochs
+
+    # thoi gian dang "tuan GPS, giay trong tuan"
+    def _parse_tow_times(self, frame, time_columns):
+        weeks = pd.to_numeric(frame[0], errors="coerce").to_numpy(dtype=np.float64)
+        seconds = pd.to_numeric(frame[1], errors="coerce").to_numpy(dtype=np.float64)
+        valid = np.isfinite(weeks) & np.isfinite(seconds)
+        microseconds = np.round((weeks[valid] * 604800 + seconds[valid]) * 1e6).astype(np.int64)
+        return valid, GPS_EPOCH + microseconds.astype("timedelta64[us]")
+
+    # doi toa do llh/xyz sang ENU (m) so voi tram base (data.base.lat/lon/hgt), enu giu nguyen
+    def _convert_to_enu(self, solformat, a, b, c):
+        if solformat == "enu":
+            return a, b, c
+        if solformat == "llh":
+            return geodesy.llh_to_enu(a, b, c, cfg.DATA_BASE_LAT, cfg.DATA_BASE_LON, cfg.DATA_BASE_HGT)
+        return geodesy.ecef_to_enu(a, b, c, cfg.DATA_BASE_LAT, cfg.DATA_BASE_LON, cfg.DATA_BASE_HGT)
+
+    # doc cot tu cache theo (duong dan, kich thuoc, mtime, phien ban parser); chua co thi parse va ghi cache
+    def read_rtkp_output_records_cached(self, file_path):
+        records_path, meta_path = self._get_cache_paths(file_path)
+        try:
+            with open(meta_path, "r") as meta_file:
+                meta = json.load(meta_file)
+            if meta["rows"] == 0:
+                records = np.empty(0, dtype=POS_RECORD_DTYPE)
+            else:
+                records = np.load(records_path, mmap_mode="r")
+            os.utime(meta_path)
+            return records, meta["line_count"]
+        except (OSError, ValueError, KeyError):
+            pass
+
+        records, line_count = self.read_rtkp_output_records(file_path)
+        try:
+            self._write_cache(records_path, meta_path, file_path, records, line_count)
+        except OSError as e:
+            print(f"-> Error writing pos cache for {file_path}: {e}")
+        return records, line_count
+
+    def _get_cache_paths(self, file_path):
+        stat = os.stat(file_path)
+        fingerprint = "|".join([
+            os.path.abspath(file_path).replace("\\", "/"),
+            str(stat.st_size),
+            str(stat.st_mtime_ns),
+            str(POS_PARSER_VERSION),
+            # toa do llh/xyz duoc doi sang ENU theo vi tri base luc parse
+            str((cfg.DATA_BASE_LAT, cfg.DATA_BASE_LON, cfg.DATA_BASE_HGT)),
+        ])
+        key = hashlib.sha1(fingerprint.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{key}.npy"), os.path.join(self.cache_dir, f"{key}.json")
+
+    # ghi file .npy truoc roi moi ghi .json, file .json ton tai nghia la cache da day du
+    def _write_cache(self, records_path, meta_path, file_path, records, line_count):
+        # exist_ok: cac worker cua process pool (data.aggregation_workers) cung tao thu muc nay
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_suffix = f".{os.getpid()}.tmp"
+        with open(records_path + tmp_suffix, "wb") as records_file:
+            np.save(records_file, records)
+        os.replace(records_path + tmp_suffix, records_path)
+
+        with open(meta_path + tmp_suffix, "w") as meta_file:
+            json.dump({
+                "file_path": file_path.replace("\\", "/"),
+                "rows": len(records),
+                "line_count": line_count,
+            }, meta_file)
+        os.replace(meta_path + tmp_suffix, meta_path)
+
+        helpers.evict_lru_files(self.cache_dir, cfg.DATA_CACHE_MAX_MB * 1024 ** 2)
+
+    # tinh trung binh tu mang cac cot, cung quy tac voi calculate_rtkp_output_file
+    def _aggregate_records(self, records, line_count, east, north, up, counters=None):
+        filtered = self._filter_records(records, line_count, east, north, up, counters)
+        if filtered is None:
+            return None
+        times, e, n, u = filtered
+
+        # cumsum cong lan luot tung phan tu nhu vong lap python (np.sum cong theo cap nen lech so)
+        total_e = float(np.cumsum(e)[-1])
+        total_n = float(np.cumsum(n)[-1])
+        total_u = float(np.cumsum(u)[-1])
+        utc_time = times[-1].astype(datetime) + POS_TIME_OFFSET
+
+        return self._build_result(utc_time, total_e, total_n, total_u, len(times))
+
+    # chia cac epoch vao cac khoang DATA_INTERVAL phut va tinh trung binh cho tung khoang
+    # tra ve danh sach ket qua (moi khoang mot dong) theo thu tu thoi gian
+    def calculate_rtkp_output_bins(self, file_path, log_path, east, north, up, counters=None, read_records=None):
+        read_records = read_records or self.read_rtkp_output_records
+        records, line_count = read_records(file_path)
+        self.update_log(log_path, file_path)
+
+        filtered = self._filter_records(records, line_count, east, north, up, counters)
+        if filtered is None:
+            return None
+        times, e, n, u = filtered
+
+        # lam tron xuong giong _build_result: phut % DATA_INTERVAL, giay = 0
+        times = times + np.timedelta64(POS_TIME_OFFSET)
+        hours = times.astype("datetime64[h]")
+        minutes = (times.astype("datetime64[m]") - hours).astype(np.int64)
+        bins = hours + (minutes - minutes % cfg.DATA_INTERVAL).astype("timedelta64[m]")
+
+        # bincount cong lan luot theo thu tu dong nen khop voi cach cong cua ban python
+        keys, inverse = np.unique(bins, return_inverse=True)
+        counts = np.bincount(inverse)
+        totals_e = np.bincount(inverse, weights=e)
+        totals_n = np.bincount(inverse, weights=n)
+        totals_u = np.bincount(inverse, weights=u)
+
+        results = []
+        for i, key in enumerate(keys):
+            result = self._build_result(
+                key.astype("datetime64[us]").astype(datetime),
+                float(totals_e[i]),
+                float(totals_n[i]),
+                float(totals_u[i]),
+                int(counts[i]),
+            )
+            if result:
+                results.append(result)
+        return results or None
+
+    # ap dung quy tac loai file va loc q, ns, nguong; tra ve (thoi gian, e, n, u) cua cac epoch hop le
+    # moi epoch chi duoc xep vao mot ly do, theo dung thu tu kiem tra cua classify_row
+    def _filter_records(self, records, line_count, east, north, up, counters=None):
+        q_valid = np.isin(records["q"], cfg.DATA_Q_VALUES)
+        ns_valid = q_valid & (records["ns"] >= 9)
+        invalid_q_counter = line_count - np.count_nonzero(q_valid)
+
+        e = (records["e"] - east) * 1000
+        n = (records["n"] - north) * 1000
+        u = (records["u"] - up) * 1000
+        accepted = (
+            ns_valid
+            & (np.abs(e) < cfg.DATA_THRESHOLD)
+            & (np.abs(n) < cfg.DATA_THRESHOLD)
+            & (np.abs(u) < cfg.DATA_THRESHOLD)
+        )
+
+        counters = self._init_counters(counters)
+        counters["accepted"] = int(np.count_nonzero(accepted))
+        counters["bad_timestamp"] = line_count - len(records)
+        counters["bad_q"] = len(records) - int(np.count_nonzero(q_valid))
+        counters["low_ns"] = int(np.count_nonzero(q_valid)) - int(np.count_nonzero(ns_valid))
+        counters["over_threshold"] = int(np.count_nonzero(ns_valid)) - counters["accepted"]
+
+        if invalid_q_counter > line_count / 2 or not accepted.any():
+            return None
+
+        return records["time"][accepted], e[accepted], n[accepted], u[accepted]
+
+    # ghi lai file vua xu ly vao file log (log_path None: nguoi goi tu ghi, vd khi chay song song)
+    def update_log(self, log_path, file_path):
+        if not log_path:
+            return
+        file_path = file_path.replace("\\", "/")
+        log_file = open(log_path, "w")
+        log_data = [
+            {
+                "file_path": file_path
+            }
+        ]
+        log_file.write(json.dumps(log_data))
+        log_file.close()
+
+    def round_timestamp(self, utc_time):
         # Round down to the nearest 30 minutes, with seconds set to 00
         utc_time = utc_time - timedelta(
             minutes=utc_time.minute % cfg.DATA_INTERVAL,
             seconds=utc_time.second,
             microseconds=utc_time.microsecond,
         )
+        return utc_time.strftime("%Y-%m-%d %H:%M:%S")
 
-        ts = utc_time.strftime("%Y-%m-%d %H:%M:%S")
+    def _build_result(self, utc_time, total_e, total_n, total_u, count):
+        ts = self.round_timestamp(utc_time)
         if ts[:4] == "0001":
             return None
         # tinh trung binh
@@ -111,49 +512,54 @@ class RTKPos:
             "averageZ": averageZ,
         }
 
-    def check_valid_q(self, row_string):
-        if not re.match(r"\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2}", row_string):
-            return None
+    # phan loai mot dong trong mot lan duy nhat (mot regex, mot split)
+    # tra ve (ly do trong POS_ROW_STATUSES, du lieu dong neu duoc chap nhan)
+    def classify_row(self, row_string, east, north, up):
+        if not re.match(POS_TIME_PATTERN, row_string):
+            return "bad_timestamp", None
 
         data = row_string.split(",")
 
         # Calculate differences and check if they are within the threshold
         q_value = int(data[4])
         if not q_value in cfg.DATA_Q_VALUES:
-            return None
-
-        return True
-    # ham hieu chuan lai du lieu theo q, ns va nguong cat tren duoi
-    def extract_valid_row(self, row_string, east, north, up):
-        if not re.match(r"\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2}", row_string):
-            return None
-
-        data = row_string.split(",")
-
-        # Calculate differences and check if they are within the threshold
-        q_value = int(data[4])
-        if not q_value in cfg.DATA_Q_VALUES:
-            return None
+            return "bad_q", None
         # tra ve none khi du lieu co so ve tinh nho hon 5
         ns = int(data[5])
         if ns < 9:
-            return None
+            return "low_ns", None
         # loai bo theo nguong
         e = (float(data[1]) - east) * 1000
         if abs(e) >= cfg.DATA_THRESHOLD:
-            return None
+            return "over_threshold", None
 
         n = (float(data[2]) - north) * 1000
         if abs(n) >= cfg.DATA_THRESHOLD:
-            return None
+            return "over_threshold", None
 
         u = (float(data[3]) - up) * 1000
         if abs(u) >= cfg.DATA_THRESHOLD:
-            return None
+            return "over_threshold", None
         # tra ve json 4 truong: thoi gian, e,n,u
-        return {
-            "utc_time": datetime.strptime(data[0], "%Y/%m/%d %H:%M:%S.%f") + timedelta(hours=8),
+        return "accepted", {
+            "utc_time": datetime.strptime(data[0], POS_TIME_FORMAT) + POS_TIME_OFFSET,
             "e": e,
             "n": n,
             "u": u,
         }
+
+    def check_valid_q(self, row_string):
+        if not re.match(POS_TIME_PATTERN, row_string):
+            return None
+
+        data = row_string.split(",")
+
+        # Calculate differences and check if they are within the threshold
+        q_value = int(data[4])
+        if not q_value in cfg.DATA_Q_VALUES:
+            return None
+
+        return True
+    # ham hieu chuan lai du lieu theo q, ns va nguong cat tren duoi
+    def extract_valid_row(self, row_string, east, north, up):
+        return self.classify_row(row_string, east, north, up)[1]
@@ -0,0 +1,191 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import common.helpers as helpers
+from modules.datastream.posfile import POS_TIME_FORMAT, RTKPos
+
+GPS_EPOCH = datetime(1980, 1, 6)
+
+
+class RTKPosFollower:
+    """
+    Follow growing .pos files (e.g. written continuously by rtknavi).
+    Progress is a byte offset per file, and only newly appended complete lines
+    are parsed into running per-interval sums.
+    The solution layout (enu/llh/xyz, field separator, time form) is read from the
+    file header with RTKPos.read_rtkp_output_layout, and every data line is turned
+    into the comma separated ENU row that RTKPos.classify_row checks.
+    """
+    def __init__(self, local_dir, east, north, up):
+        self.rtkpos = RTKPos(local_dir)
+        self.east = east
+        self.north = north
+        self.up = up
+        self.state_path = os.path.join(self.rtkpos.local_dir, "posfollow.txt").replace("\\", "/")
+        self.live_path = os.path.join(self.rtkpos.local_dir, "live.csv").replace("\\", "/")
+        self.state = self._load_state()
+
+    def _load_state(self):
+        """Load the per-file byte offsets and running aggregates"""
+        if not helpers.check_files_exist([self.state_path]):
+            return {}
+        try:
+            with open(self.state_path, "r") as state_file:
+                return json.load(state_file)
+        except Exception as e:
+            print(f"-> Error reading follow state: {e}")
+            return {}
+
+    def _save_state(self):
+        """Write the follow state atomically"""
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w") as state_file:
+            json.dump(self.state, state_file)
+        os.replace(tmp_path, self.state_path)
+
+    def get_followed_file_paths(self, output_dir):
+        """List the solution files in output_dir, skipping stat and event files"""
+        file_paths = []
+        with os.scandir(output_dir) as entries:
+            for entry in entries:
+                if not entry.is_file() or not entry.name.endswith(".pos"):
+                    continue
+                if entry.name.endswith("_events.pos"):
+                    continue
+                file_paths.append(os.path.join(output_dir, entry.name).replace("\\", "/"))
+        return sorted(file_paths)
+
+    def poll(self, file_paths):
+        """
+        Parse the complete lines appended to each file since the last poll.
+        Returns True when any running aggregate changed.
+        """
+        changed = False
+        for file_path in file_paths:
+            changed = self._poll_file(file_path) or changed
+
+        # drop state of files that no longer exist
+        for file_path in list(self.state):
+            if file_path not in file_paths:
+                del self.state[file_path]
+                changed = True
+
+        if changed:
+            self._save_state()
+            self._write_live_output()
+        return changed
+
+    def _poll_file(self, file_path):
+        """Read new complete lines of a single file from its byte offset checkpoint"""
+        file_state = self.state.get(file_path)
+        size = os.path.getsize(file_path)
+        if file_state is None or size < file_state["offset"]:
+            # new file, or the file was truncated and rewritten from the start
+            file_state = {"offset": 0, "lines": 0, "invalid": 0, "bins": {}}
+            self.state[file_path] = file_state
+        if size == file_state["offset"]:
+            return False
+
+        with open(file_path, "rb") as file:
+            file.seek(file_state["offset"])
+            data = file.read(size - file_state["offset"])
+
+        # only consume up to the last newline, a partial line is read again next poll
+        end = data.rfind(b"\n")
+        if end < 0:
+            return False
+        file_state["offset"] += end + 1
+
+        for line in data[:end + 1].decode("utf-8", errors="replace").splitlines():
+            file_state["lines"] += 1
+            row = self._to_enu_row(file_state, line)
+            if row is None:
+                # header, or a line that does not parse with the file layout
+                file_state["invalid"] += 1
+                continue
+            status, line_data = self.rtkpos.classify_row(row, self.east, self.north, self.up)
+            if status in ("bad_timestamp", "bad_q"):
+                file_state["invalid"] += 1
+            if not line_data:
+                continue
+
+            ts = self.rtkpos.round_timestamp(line_data["utc_time"])
+            total = file_state["bins"].setdefault(ts, [0, 0, 0, 0])
+            total[0] += line_data["e"]
+            total[1] += line_data["n"]
+            total[2] += line_data["u"]
+            total[3] += 1
+        return True
+
+    def _to_enu_row(self, file_state, line):
+        """
+        Line as "yyyy/mm/dd hh:mm:ss.fff,e,n,u,q,ns" with e/n/u relative to the base,
+        or None for header lines and lines that cannot be parsed.
+        Header lines are kept until the first data line fixes the layout of the file.
+        """
+        if not line.strip():
+            return None
+        layout = file_state.get("layout")
+        if line.startswith("%"):
+            if layout is None:
+                file_state.setdefault("header", []).append(line)
+            return None
+        if layout is None:
+            try:
+                layout = self.rtkpos.read_rtkp_output_layout("\n".join(file_state.get("header", []) + [line]))
+            except ValueError as e:
+                print(f"-> {e}")
+                return None
+            file_state["layout"] = layout
+            file_state.pop("header", None)
+
+        try:
+            fields = [field.strip() for field in line.split(layout["sep"])] if layout["sep"] else line.split()
+            if layout["timeform"] == "hms":
+                # date and time are two columns when the separator is whitespace
+                time_columns = 1 if layout["sep"] else 2
+                time = datetime.strptime(" ".join(fields[:time_columns]), POS_TIME_FORMAT)
+            else:
+                time_columns = 2
+                time = GPS_EPOCH + timedelta(weeks=float(fields[0]), seconds=float(fields[1]))
+            if layout["timesys"] == "JST":
+                time -= timedelta(hours=9)
+            a, b, c = (float(field) for field in fields[time_columns:time_columns + 3])
+            q, ns = (int(float(field)) for field in fields[time_columns + 3:time_columns + 5])
+        except (IndexError, ValueError):
+            return None
+        e, n, u = self.rtkpos._convert_to_enu(layout["solformat"], a, b, c)
+        return f"{time.strftime(POS_TIME_FORMAT)},{float(e)!r},{float(n)!r},{float(u)!r},{q},{ns}"
+
+    def get_live_results(self):
+        """Current per-interval averages of all followed files, in timestamp order"""
+        results = {}
+        for file_state in self.state.values():
+            # same rule as RTKPos: skip files with more than half invalid lines
+            if file_state["invalid"] > file_state["lines"] / 2:
+                continue
+            for ts, (total_e, total_n, total_u, count) in file_state["bins"].items():
+                results[ts] = {
+                    "timestamp": ts,
+                    "averageX": float(total_e / count),
+                    "averageY": float(total_n / count),
+                    "averageZ": float(total_u / count),
+                }
+        return [results[ts] for ts in sorted(results)]
+
+    def _write_live_output(self):
+        """Rewrite live.csv with the running averages"""
+        tmp_path = self.live_path + ".tmp"
+        with open(tmp_path, "w") as live_file:
+            live_file.write(",".join(self.rtkpos.OUTPUT_FILE_HEADERS) + "\n")
+            for result in self.get_live_results():
+                live_file.write(
+                    '"{}",{:.5f},{:.5f},{:.5f}\n'.format(
+                        result["timestamp"],
+                        result["averageX"],
+                        result["averageY"],
+                        result["averageZ"]
+                    )
+                )
+        os.replace(tmp_path, self.live_path)
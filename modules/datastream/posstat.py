@@ -0,0 +1,126 @@
+import math
+import os
+from datetime import datetime, timedelta
+
+from modules.datastream.posfile import POS_TIME_OFFSET
+
+GPS_EPOCH = datetime(1980, 1, 6)
+STAT_SUMMARY_HEADERS = [
+    "FILE", "HOUR", "SAT", "FRQ", "EPOCHS", "VALID", "RMS_PHASE(m)", "RMS_CODE(m)",
+    "MEAN_SNR", "FIXED", "SLIPS", "MAX_LOCK", "MAX_OUTAGE",
+]
+
+
+class RTKPosStat:
+    """
+    Streaming reader for the residual files (.pos.stat) written by rnx2rtkp
+    with out-outstat=residual. Each file is reduced to one row per hour and
+    satellite/frequency, plus one "POS" row per hour with the solution status.
+    """
+
+    def summarize(self, stat_path):
+        """Read a .pos.stat file line by line and return its summary rows"""
+        sats = {}
+        solutions = {}
+        with open(stat_path, "r") as stat_file:
+            for line in stat_file:
+                if line.startswith("$SAT,"):
+                    self._add_sat_record(sats, line.rstrip().split(","))
+                elif line.startswith("$POS,"):
+                    self._add_pos_record(solutions, line.rstrip().split(","))
+
+        rows = []
+        for (hour, sat, frq), total in sats.items():
+            valid = total["valid"]
+            rows.append({
+                "HOUR": hour,
+                "SAT": sat,
+                "FRQ": frq,
+                "EPOCHS": total["epochs"],
+                "VALID": valid,
+                "RMS_PHASE(m)": "{:.4f}".format(math.sqrt(total["resp2"] / valid)) if valid else "",
+                "RMS_CODE(m)": "{:.4f}".format(math.sqrt(total["resc2"] / valid)) if valid else "",
+                "MEAN_SNR": "{:.1f}".format(total["snr"] / total["epochs"]),
+                "FIXED": total["fixed"],
+                "SLIPS": total["slips"],
+                "MAX_LOCK": total["max_lock"],
+                "MAX_OUTAGE": total["max_outage"],
+            })
+        for hour, total in solutions.items():
+            rows.append({
+                "HOUR": hour,
+                "SAT": "POS",
+                "FRQ": 0,
+                "EPOCHS": total["epochs"],
+                "VALID": total["epochs"] - total["none"],
+                "FIXED": total["fixed"],
+            })
+        return sorted(rows, key=lambda row: (row["HOUR"], row["SAT"], row["FRQ"]))
+
+    def _get_hour(self, week, tow):
+        """GPS week/tow to the same local hour convention as output.csv"""
+        epoch = GPS_EPOCH + timedelta(weeks=int(week), seconds=float(tow)) + POS_TIME_OFFSET
+        return epoch.strftime("%Y-%m-%d %H:00:00")
+
+    def _add_sat_record(self, sats, fields):
+        # $SAT,week,tow,sat,frq,az,el,resp,resc,vsat,snr,fix,slip,lock,outc,slipc,rejc
+        if len(fields) < 17:
+            return
+        key = (self._get_hour(fields[1], fields[2]), fields[3], int(fields[4]))
+        total = sats.get(key)
+        if total is None:
+            total = {"epochs": 0, "valid": 0, "resp2": 0.0, "resc2": 0.0, "snr": 0.0,
+                     "fixed": 0, "slips": 0, "max_lock": 0, "max_outage": 0}
+            sats[key] = total
+
+        total["epochs"] += 1
+        if int(fields[9]):
+            total["valid"] += 1
+            total["resp2"] += float(fields[7]) ** 2
+            total["resc2"] += float(fields[8]) ** 2
+        total["snr"] += float(fields[10])
+        # fix: 1 float, 2 fix, 3 hold
+        if int(fields[11]) >= 2:
+            total["fixed"] += 1
+        if int(fields[12]):
+            total["slips"] += 1
+        total["max_lock"] = max(total["max_lock"], int(fields[13]))
+        total["max_outage"] = max(total["max_outage"], int(fields[14]))
+
+    def _add_pos_record(self, solutions, fields):
+        # $POS,week,tow,stat,posx,posy,posz,posxf,posyf,poszf (stat: 0 none, 1 fix, 2 float, ...)
+        if len(fields) < 4:
+            return
+        hour = self._get_hour(fields[1], fields[2])
+        total = solutions.setdefault(hour, {"epochs": 0, "none": 0, "fixed": 0})
+        total["epochs"] += 1
+        stat = int(fields[3])
+        if stat == 0:
+            total["none"] += 1
+        elif stat == 1:
+            total["fixed"] += 1
+
+    def write_summary(self, summary_path, stat_path, rows):
+        """Append summary rows to the per-rover summary csv"""
+        summary_exists = os.path.exists(summary_path) and os.path.getsize(summary_path) > 0
+        file_name = os.path.basename(stat_path)
+        with open(summary_path, "a") as summary_file:
+            if not summary_exists:
+                summary_file.write(",".join(STAT_SUMMARY_HEADERS) + "\n")
+            for row in rows:
+                row = dict(row, FILE=file_name)
+                summary_file.write(",".join(str(row.get(name, "")) for name in STAT_SUMMARY_HEADERS) + "\n")
+
+    def summarize_and_remove(self, stat_path, summary_path):
+        """
+        Store the summary of a .pos.stat file, then delete the raw file.
+        The raw file is kept if it cannot be summarized.
+        """
+        try:
+            rows = self.summarize(stat_path)
+            self.write_summary(summary_path, stat_path, rows)
+        except Exception as e:
+            print(f"-> Error summarizing {stat_path}: {e}")
+            return False
+        os.remove(stat_path)
+        return True
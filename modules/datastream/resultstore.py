@@ -0,0 +1,137 @@
+import os
+import sqlite3
+
+
+class ResultStore:
+    """
+    Per-rover interval averages in SQLite, keyed by timestamp.
+    Writing the same timestamp again replaces the row, and the last value or a
+    time range are index lookups. output.csv is exported from the store: new rows
+    are appended, and the file is rewritten only when an already exported
+    timestamp was updated.
+    Rows without a solution ("NAN" in output.csv) are stored as NULL.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path.replace("\\", "/")
+        self.connection = sqlite3.connect(self.db_path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            "timestamp TEXT PRIMARY KEY, averageX REAL, averageY REAL, averageZ REAL"
+            ") WITHOUT ROWID"
+        )
+        self.connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.connection.commit()
+        else:
+            self.connection.rollback()
+
+    def close(self):
+        self.connection.close()
+
+    def _get_meta(self, key):
+        row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self.connection.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value)
+        )
+
+    def upsert(self, timestamp, values):
+        """Insert or replace the averages of one interval; values is (x, y, z) or None"""
+        x, y, z = values if values else (None, None, None)
+        self.connection.execute(
+            "INSERT INTO results (timestamp, averageX, averageY, averageZ) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(timestamp) DO UPDATE SET "
+            "averageX = excluded.averageX, averageY = excluded.averageY, averageZ = excluded.averageZ",
+            (timestamp, x, y, z)
+        )
+        exported = self._get_meta("exported_timestamp")
+        if exported and timestamp <= exported:
+            self._set_meta("export_dirty", "1")
+
+    def _to_result(self, row):
+        return {"timestamp": row[0], "averageX": row[1], "averageY": row[2], "averageZ": row[3]}
+
+    def last(self):
+        """Latest row with a solution, or None"""
+        row = self.connection.execute(
+            "SELECT timestamp, averageX, averageY, averageZ FROM results "
+            "WHERE averageX IS NOT NULL ORDER BY timestamp DESC LIMIT 1"
+        ).fetchone()
+        return self._to_result(row) if row else None
+
+    def range(self, start=None, end=None):
+        """Rows with start <= timestamp <= end in timestamp order, either bound may be None"""
+        query = "SELECT timestamp, averageX, averageY, averageZ FROM results WHERE 1 = 1"
+        params = []
+        if start is not None:
+            query += " AND timestamp >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND timestamp <= ?"
+            params.append(end)
+        query += " ORDER BY timestamp"
+        return [self._to_result(row) for row in self.connection.execute(query, params)]
+
+    def is_empty(self):
+        return self.connection.execute("SELECT 1 FROM results LIMIT 1").fetchone() is None
+
+    def import_csv(self, csv_path):
+        """Load an existing output.csv, e.g. when switching a rover to the store"""
+        with open(csv_path, "r") as csv_file:
+            next(csv_file, None)
+            for line in csv_file:
+                fields = [field.strip('"') for field in line.strip().split(",")]
+                if len(fields) < 4:
+                    continue
+                values = None if fields[1] == "NAN" else tuple(float(field) for field in fields[1:4])
+                self.upsert(fields[0], values)
+        # nothing is marked as exported yet, so the next export rewrites the csv from the store
+        self.connection.commit()
+
+    def _format_row(self, result):
+        if result["averageX"] is None:
+            return f'"{result["timestamp"]}","NAN","NAN","NAN"\n'
+        return '"{}",{:.5f},{:.5f},{:.5f}\n'.format(
+            result["timestamp"], result["averageX"], result["averageY"], result["averageZ"]
+        )
+
+    def export_csv(self, csv_path, headers):
+        """
+        Bring csv_path up to date with the store, in the output.csv format.
+        A rewrite replaces the file (new inode), which OutputMerger takes as the signal
+        to rebuild data/output.csv instead of reading on from its old offset.
+        Returns the number of rows written.
+        """
+        exported = self._get_meta("exported_timestamp")
+        rewrite = (
+            exported is None
+            or self._get_meta("export_dirty") == "1"
+            or not os.path.exists(csv_path)
+        )
+
+        if rewrite:
+            rows = self.range()
+            tmp_path = csv_path + ".tmp"
+            with open(tmp_path, "w") as csv_file:
+                csv_file.write(",".join(headers) + "\n")
+                csv_file.writelines(self._format_row(row) for row in rows)
+            os.replace(tmp_path, csv_path)
+        else:
+            rows = [row for row in self.range(exported) if row["timestamp"] > exported]
+            with open(csv_path, "a") as csv_file:
+                csv_file.writelines(self._format_row(row) for row in rows)
+
+        if rows:
+            self._set_meta("exported_timestamp", rows[-1]["timestamp"])
+        self._set_meta("export_dirty", "0")
+        self.connection.commit()
+        return len(rows)
@@ -0,0 +1,131 @@
+"""
+Deterministic stand-ins for tps2rin and rnx2rtkp (modules.backends.FakeBackend).
+
+    python fakebin.py tps2rin -i <tps file> -o <output dir>
+    python fakebin.py rnx2rtkp [--reference e,n,u] -k <conf> [-s ,] [-ts y/m/d h:m:s] [-te y/m/d h:m:s]
+                               [-ti seconds] -o <pos file> <rover obs> <base obs> <nav>
+
+tps2rin writes <name><doy><hour>.<yy>o/.<yy>p for a TPS file named like Base_3600_0312d,
+rnx2rtkp writes one ENU solution per epoch of the rover obs hour (or of -ts/-te). The
+values only depend on the input contents, so repeated runs give identical files.
+"""
+import hashlib
+import math
+import os
+import sys
+from datetime import datetime, timedelta
+
+RINEX_TIME_FORMAT = "%Y %m %d %H %M %S"
+POS_TIME_FORMAT = "%Y/%m/%d %H:%M:%S"
+HOUR_LETTERS = "abcdefghijklmnopqrstuvwx"
+
+
+def get_digest(path):
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def tps2rin(tps_file_path, output_dir):
+    base_name = os.path.basename(tps_file_path)
+    name = os.path.splitext(base_name)[0]
+    # e.g. Base_3600_0312d: month/day and hour letter at the end
+    month, day, hour_letter = int(name[-5:-3]), int(name[-3:-1]), name[-1].lower()
+    year = datetime.fromtimestamp(os.path.getmtime(tps_file_path)).year
+    start = datetime(year, month, day, HOUR_LETTERS.index(hour_letter))
+    doy = start.timetuple().tm_yday
+    prefix = os.path.join(output_dir, f"{name[:4].lower()}{doy:03d}{hour_letter}.{year % 100:02d}")
+    digest = get_digest(tps_file_path)
+
+    with open(prefix + "o", "w") as obs_file:
+        obs_file.write(f"{'3.04':>9}{'':11}OBSERVATION DATA    M{'':19}RINEX VERSION / TYPE\n")
+        obs_file.write(f"{digest[:60]:<60}COMMENT\n")
+        obs_file.write(f"{start.strftime(RINEX_TIME_FORMAT):<43}{'GPS':<17}TIME OF FIRST OBS\n")
+        obs_file.write(f"{(start + timedelta(seconds=3599)).strftime(RINEX_TIME_FORMAT):<43}{'GPS':<17}TIME OF LAST OBS\n")
+        obs_file.write(f"{'':60}END OF HEADER\n")
+    with open(prefix + "p", "w") as nav_file:
+        nav_file.write(f"{'3.04':>9}{'':11}NAVIGATION DATA     M{'':19}RINEX VERSION / TYPE\n")
+        nav_file.write(f"{digest[:60]:<60}COMMENT\n")
+        nav_file.write(f"{'':60}END OF HEADER\n")
+    return 0
+
+
+def read_obs_window(obs_file_path):
+    """TIME OF FIRST OBS / TIME OF LAST OBS of a RINEX obs header, the last one defaults to one hour later"""
+    first = last = None
+    with open(obs_file_path, "r", errors="replace") as obs_file:
+        for line in obs_file:
+            label = line[60:].strip()
+            if label == "TIME OF FIRST OBS":
+                first = datetime.strptime(" ".join(line[:43].split()[:6]).split(".")[0], RINEX_TIME_FORMAT)
+            elif label == "TIME OF LAST OBS":
+                last = datetime.strptime(" ".join(line[:43].split()[:6]).split(".")[0], RINEX_TIME_FORMAT)
+            elif label == "END OF HEADER":
+                break
+    if first is None:
+        raise ValueError(f"no TIME OF FIRST OBS in {obs_file_path}")
+    return first, last or first + timedelta(seconds=3599)
+
+
+def rnx2rtkp(args):
+    options = {"-s": " ", "-ti": "1", "--reference": "0,0,0"}
+    inputs = []
+    index = 0
+    while index < len(args):
+        arg = args[index]
+        if arg in ("-ts", "-te"):
+            options[arg] = datetime.strptime(f"{args[index + 1]} {args[index + 2]}".split(".")[0], POS_TIME_FORMAT)
+            index += 3
+        elif arg in ("-k", "-o", "-s", "-ti", "--reference"):
+            options[arg] = args[index + 1]
+            index += 2
+        else:
+            inputs.append(arg)
+            index += 1
+    if "-o" not in options or len(inputs) < 2:
+        print("fakebin rnx2rtkp: -o and rover/base obs files are required", file=sys.stderr)
+        return 1
+
+    first, last = read_obs_window(inputs[0])
+    start = max(first, options.get("-ts", first))
+    end = min(last, options.get("-te", last))
+    step = float(options["-ti"])
+    east, north, up = (float(value) for value in options["--reference"].split(","))
+    # noise of a few mm, seeded by the inputs
+    seed = int(hashlib.sha256("".join(get_digest(path) for path in inputs).encode("utf-8")).hexdigest()[:8], 16)
+    sep = options["-s"]
+
+    with open(options["-o"], "w") as pos_file:
+        pos_file.write(f"% program   : fakebin rnx2rtkp\n% inp file  : {inputs[0]}\n")
+        labels = ["e-baseline(m)", "n-baseline(m)", "u-baseline(m)", "Q", "ns", "sde(m)", "sdn(m)", "sdu(m)", "ratio"]
+        pos_file.write(f"%  GPST{'':18}{sep}{sep.join(labels)}\n")
+        epoch = 0
+        time = start
+        while time <= end:
+            # seconds since the GPS epoch keep epochs of overlapping windows identical
+            second = int((time - datetime(1980, 1, 6)).total_seconds())
+            phase = (seed % 1000) + second / 600.0
+            values = [
+                east + 0.003 * math.sin(phase),
+                north + 0.003 * math.cos(phase),
+                up + 0.005 * math.sin(phase / 2),
+            ]
+            row = [time.strftime(POS_TIME_FORMAT) + ".000"] + [f"{value:.4f}" for value in values]
+            row += ["1", "12", "0.0030", "0.0030", "0.0060", "999.9"]
+            pos_file.write(sep.join(row) + "\n")
+            epoch += 1
+            time = start + timedelta(seconds=epoch * step)
+    return 0
+
+
+def main(argv):
+    if len(argv) < 2 or argv[1] not in ("tps2rin", "rnx2rtkp"):
+        print(__doc__, file=sys.stderr)
+        return 2
+    if argv[1] == "tps2rin":
+        args = dict(zip(argv[2::2], argv[3::2]))
+        return tps2rin(args["-i"], args["-o"])
+    return rnx2rtkp(argv[2:])
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv))
@@ -1,20 +1,39 @@
 import os
 import shutil
-import subprocess
 import sys
-import time
+import tempfile
 
 import common.helpers as helpers
 import common.parser as cfg
+from common.completion import PendingOutputs, commit_outputs, run_commands, run_to_completion
+from common.staging import stage_file
+from modules.backends import get_backend
+from modules.slicing import get_obs_window, get_pos_time, get_slices, get_stat_time, stitch_files
+from modules.solvecache import SolveCache
 
 project_dir = str(cfg.DATA_DIR).replace("data", "")
 sys.path.append(os.path.join(project_dir, "modules").replace("\\", "/"))
 
+# rnx2rtkp options besides -k/-o, part of the solve cache key
+SOLVER_OPTIONS = ["-s", ","]
+
 class RNX2RTKPProcessor:
     def __init__(self):
         self.cur_dir = os.path.split(os.path.abspath(__file__))[0]
-        self.bin_file = os.path.join(self.cur_dir, "rnx2rtkp.exe").replace("\\", "/")
+        # modules.backends: which rnx2rtkp build runs and how its command line is built
+        self.backend = get_backend()
         self.config_file = os.path.join(self.cur_dir, cfg.RNX2RTKP_CONFIG_FILE).replace("\\", "/")
+        # common.staging.StagingArea shared by the jobs of a cycle for the base files
+        self.base_staging = None
+        # split one observation window into time slices solved in parallel (modules.slicing), 1: off
+        self.solve_slices = cfg.PIPELINE_SOLVE_SLICES
+        self.slice_overlap_seconds = cfg.PIPELINE_SLICE_OVERLAP_SECONDS
+        # modules.solvecache.SolveCache, None runs rnx2rtkp for every solve
+        self.solve_cache = None
+        if cfg.PIPELINE_SOLVE_CACHE:
+            self.solve_cache = SolveCache(
+                os.path.join(cfg.DATA_DIR, "solvecache"), cfg.PIPELINE_SOLVE_CACHE_MAX_MB * 1024 ** 2
+            )
 
     def generate_input_file_groups(self, base_file_names, rover_processed_dir, base_prefix, rover_prefix):
         """
@@ -52,7 +71,8 @@ class RNX2RTKPProcessor:
 
     def process_file_group(self, group, output_dir):
         """
-        Process a group of files and remove rover files if successful
+        Process a group of files and remove rover files if successful.
+        Returns whether rnx2rtkp produced the .pos file
         """
         output_file = os.path.join(output_dir, f"output_{group['time_name']}.pos").replace("\\", "/")
         success = self.exec_rnx2rtkp(
@@ -65,10 +85,12 @@ class RNX2RTKPProcessor:
         if success:
             self._remove_rover_files(group)
             print("Done")
+        return success
 
     def process_file_group_and_remove(self, group, output_dir):
         """
-        Process a group of files and remove all files if successful
+        Process a group of files and remove all files if successful.
+        Returns whether rnx2rtkp produced the .pos file
         """
         output_file = os.path.join(output_dir, f"output_{group['time_name']}.pos").replace("\\", "/")
         success = self.exec_rnx2rtkp(
@@ -81,25 +103,151 @@ class RNX2RTKPProcessor:
         if success:
             self._remove_all_files(group)
             print("Done")
+        return success
 
     def exec_rnx2rtkp(self, obs_rover_file, obs_base_file, nav_rover_file, output_file):
         """
-        Execute the rnx2rtkp command
+        Execute the rnx2rtkp command.
+        Each job runs in its own temporary working directory, with the inputs linked into it
+        (common.staging), so parallel jobs neither share files nor change the process
+        working directory. Base files come from base_staging when it is set.
+        The .pos file (and its .stat/_events side files) appears in the output directory
+        only when rnx2rtkp exited with 0 and wrote a non-empty solution (common.completion).
+        A solve whose inputs, config and binary were solved before is restored from solve_cache.
         """
-        for file in [obs_rover_file, obs_base_file, nav_rover_file]:
-            shutil.copy(file, self.cur_dir)
+        output_name = os.path.basename(output_file)
+        input_files = [obs_rover_file, obs_base_file, nav_rover_file]
+        outputs = PendingOutputs(os.path.dirname(os.path.abspath(output_file)))
         try:
-            os.chdir(self.cur_dir)
-            cmd = f'{self.bin_file} -k {self.config_file} -s , -o {output_file} {os.path.split(obs_rover_file)[-1]} {os.path.split(obs_base_file)[-1]} {os.path.split(nav_rover_file)[-1]}'
-            subprocess.call(cmd, shell=cfg.LOGGING)
-            time.sleep(1)
-            for file in [obs_rover_file, obs_base_file, nav_rover_file]:
-                os.remove(os.path.join(self.cur_dir, os.path.split(file)[-1]))
-            os.chdir("..")
+            cache_key = self._get_cache_key(input_files)
+            if cache_key and self._restore_cached(cache_key, outputs, output_name):
+                print(f"-> rnx2rtkp {output_name} restored from solve cache")
+                return True
+            committed = self._run_rnx2rtkp(input_files, outputs, output_name)
+            if committed is None:
+                return False
+            if cache_key:
+                try:
+                    self.solve_cache.store(cache_key, committed, output_name)
+                except OSError as e:
+                    print(f"-> Error writing solve cache for {output_name}: {e}")
             return True
         except Exception as e:
             print(f"Error executing rnx2rtkp: {e}")
             return False
+        finally:
+            outputs.discard()
+
+    def _run_rnx2rtkp(self, input_files, outputs, output_name):
+        """Run the solver in a temporary job directory, returns the committed output paths or None"""
+        # under data/ like the inputs, os.link does not work across volumes
+        os.makedirs(cfg.JOBS_DIR, exist_ok=True)
+        job_dir = tempfile.mkdtemp(prefix="rnx2rtkp_", dir=cfg.JOBS_DIR)
+        try:
+            input_names = []
+            for file in input_files:
+                if self.base_staging is not None and file != input_files[0]:
+                    file = self.base_staging.stage(file)
+                input_name = os.path.basename(file)
+                stage_file(file, os.path.join(job_dir, input_name))
+                input_names.append(input_name)
+            slices = self._get_slices(input_files[0])
+            if slices:
+                return self._run_rnx2rtkp_sliced(slices, input_names, outputs, output_name, job_dir)
+            cmd = self.backend.get_rnx2rtkp_command(
+                self.config_file, SOLVER_OPTIONS, outputs.path(output_name), input_names
+            )
+            return run_to_completion(
+                f"rnx2rtkp {output_name}", cmd, outputs, required=[output_name], cwd=job_dir
+            )
+        finally:
+            shutil.rmtree(job_dir, ignore_errors=True)
+
+    def _get_slices(self, obs_rover_file):
+        """Time slices of the rover obs window, None to solve it in one run"""
+        if self.solve_slices <= 1:
+            return None
+        try:
+            window = get_obs_window(obs_rover_file)
+        except (OSError, ValueError) as e:
+            print(f"-> Cannot read the obs window of {obs_rover_file}, solving it in one run: {e}")
+            return None
+        if window is None:
+            return None
+        slices = get_slices(window[0], window[1], self.solve_slices, self.slice_overlap_seconds)
+        return slices if len(slices) > 1 else None
+
+    def _run_rnx2rtkp_sliced(self, slices, input_names, outputs, output_name, job_dir):
+        """
+        Solve each slice with -ts/-te at the same time, then stitch the slice outputs
+        into output_name. Every epoch is taken from the slice whose core window holds
+        it; the overlap only lets the filter converge before the core starts.
+        Slice windows are in GPST, like the RINEX header times.
+        """
+        name = f"rnx2rtkp {output_name}"
+        stem = os.path.splitext(output_name)[0]
+        slice_stems = [f"{stem}.slice{index}" for index in range(len(slices))]
+        cmds = [
+            self.backend.get_rnx2rtkp_command(
+                self.config_file, SOLVER_OPTIONS + time_slice.get_options(), outputs.path(f"{slice_stem}.pos"), input_names
+            )
+            for slice_stem, time_slice in zip(slice_stems, slices)
+        ]
+        try:
+            if not run_commands(name, cmds, cwd=job_dir):
+                return None
+            reason = outputs.get_invalid([f"{slice_stem}.pos" for slice_stem in slice_stems])
+            if reason:
+                print(f"-> {name} output rejected: {reason}")
+                return None
+            self._stitch_slices(outputs, slices, slice_stems, stem)
+            return commit_outputs(name, outputs, [output_name])
+        finally:
+            outputs.discard()
+
+    def _stitch_slices(self, outputs, slices, slice_stems, stem):
+        """Join <stem>.sliceN.pos and its side files (.pos.stat, _events.pos) into <stem>.pos, ..."""
+        suffixes = {}
+        for name in os.listdir(outputs.tmp_dir):
+            for index, slice_stem in enumerate(slice_stems):
+                if name.startswith(slice_stem) and name[len(slice_stem):len(slice_stem) + 1] in (".", "_"):
+                    suffixes.setdefault(name[len(slice_stem):], []).append(index)
+                    break
+        for suffix, indexes in suffixes.items():
+            indexes.sort()
+            slice_paths = [outputs.path(slice_stems[index] + suffix) for index in indexes]
+            get_time = get_stat_time if suffix.endswith(".stat") else get_pos_time
+            stitch_files(slice_paths, [slices[index] for index in indexes], outputs.path(stem + suffix), get_time)
+            for slice_path in slice_paths:
+                os.remove(slice_path)
+
+    def _get_cache_key(self, input_files):
+        """Solve cache key, None when the cache is off or a file cannot be hashed"""
+        if self.solve_cache is None:
+            return None
+        try:
+            options = " ".join(SOLVER_OPTIONS)
+            if self.solve_slices > 1:
+                # stitched solves differ from single runs near the slice boundaries
+                options += f" slices={self.solve_slices} overlap={self.slice_overlap_seconds}"
+            return self.solve_cache.get_key(
+                input_files, self.config_file, self.backend.get_rnx2rtkp_path(), options
+            )
+        except OSError as e:
+            print(f"-> Solve cache skipped: {e}")
+            return None
+
+    def _restore_cached(self, cache_key, outputs, output_name):
+        """Commit the cached outputs of cache_key, False on a miss or an entry evicted meanwhile"""
+        try:
+            if not self.solve_cache.restore(cache_key, outputs, output_name):
+                return False
+        except OSError:
+            return False
+        if outputs.get_invalid([output_name]):
+            return False
+        outputs.commit([output_name])
+        return True
 
     def _remove_rover_files(self, group):
         """
@@ -0,0 +1,117 @@
+import re
+from datetime import datetime, timedelta
+
+RINEX_TIME_FORMAT = "%Y %m %d %H %M %S"
+POS_TIME_PATTERN = re.compile(r"\s*(\d{4}/\d{2}/\d{2} \d{2}:\d{2}:\d{2}(\.\d+)?)")
+POS_TOW_PATTERN = re.compile(r"\s*(\d{3,4})[\s,;]+(\d+(\.\d+)?)")
+GPS_EPOCH = datetime(1980, 1, 6)
+
+
+class TimeSlice:
+    """
+    One part of an observation window. Epochs in [core_start, core_end) are taken
+    from this slice; the solve runs over [solve_start, solve_end], which extends the
+    core by the overlap on both sides so the filter has converged by core_start.
+    """
+
+    def __init__(self, core_start, core_end, solve_start, solve_end):
+        self.core_start = core_start
+        self.core_end = core_end
+        self.solve_start = solve_start
+        self.solve_end = solve_end
+
+    def get_options(self):
+        """rnx2rtkp -ts/-te options of the solve window"""
+        return [
+            "-ts", *self.solve_start.strftime("%Y/%m/%d %H:%M:%S").split(),
+            "-te", *self.solve_end.strftime("%Y/%m/%d %H:%M:%S").split(),
+        ]
+
+    def contains(self, time):
+        return self.core_start <= time < self.core_end
+
+
+def get_obs_window(obs_file_path):
+    """
+    (first, last) epoch of a RINEX obs file from the TIME OF FIRST OBS / TIME OF LAST OBS
+    header lines, None when the header does not have both
+    """
+    times = {}
+    with open(obs_file_path, "r", errors="replace") as obs_file:
+        for line in obs_file:
+            label = line[60:].strip()
+            if label in ("TIME OF FIRST OBS", "TIME OF LAST OBS"):
+                fields = line[:43].split()
+                times[label] = datetime.strptime(" ".join(fields[:5] + [fields[5].split(".")[0]]), RINEX_TIME_FORMAT)
+            elif label == "END OF HEADER":
+                break
+    if len(times) < 2:
+        return None
+    return times["TIME OF FIRST OBS"], times["TIME OF LAST OBS"]
+
+
+def get_slices(first, last, count, overlap_seconds, min_core_seconds=60):
+    """
+    Split [first, last] into at most count slices with whole-second boundaries.
+    The cores cover the window without gaps or overlap, so every epoch belongs to
+    exactly one slice; fewer slices are made when a core would be shorter than
+    min_core_seconds.
+    """
+    end = last + timedelta(seconds=1)
+    total_seconds = int((end - first).total_seconds())
+    count = max(1, min(count, total_seconds // max(1, min_core_seconds)))
+    overlap = timedelta(seconds=overlap_seconds)
+    boundaries = [first + timedelta(seconds=total_seconds * index // count) for index in range(count)] + [end]
+    slices = []
+    for index in range(count):
+        core_start, core_end = boundaries[index], boundaries[index + 1]
+        slices.append(TimeSlice(core_start, core_end, max(first, core_start - overlap), min(last, core_end + overlap)))
+    # the last core takes everything after its start, epochs past TIME OF LAST OBS included
+    slices[-1].core_end = datetime.max
+    slices[0].core_start = datetime.min
+    return slices
+
+
+def get_pos_time(line):
+    """Epoch of a .pos data line, in hms (2025/03/12 03:00:00.000) or tow (2355 270000.000) form"""
+    match = POS_TIME_PATTERN.match(line)
+    if match:
+        return datetime.strptime(match.group(1).split(".")[0], "%Y/%m/%d %H:%M:%S") + timedelta(
+            seconds=float("0." + match.group(2)[1:]) if match.group(2) else 0
+        )
+    match = POS_TOW_PATTERN.match(line)
+    if match:
+        return GPS_EPOCH + timedelta(weeks=int(match.group(1)), seconds=float(match.group(2)))
+    return None
+
+
+def get_stat_time(line):
+    """Epoch of a solution status line ($POS,week,tow,...), always GPST"""
+    fields = line.split(",")
+    try:
+        return GPS_EPOCH + timedelta(weeks=int(fields[1]), seconds=float(fields[2]))
+    except (IndexError, ValueError):
+        return None
+
+
+def stitch_files(slice_paths, slices, output_path, get_time):
+    """
+    Join the per-slice files into output_path in time order. Header lines (no epoch)
+    are kept from the first slice; each epoch line comes from the slice whose core
+    contains it, so the overlap epochs of the neighbouring slices are dropped.
+    Returns the number of epoch lines written.
+    """
+    written = 0
+    with open(output_path, "w") as output_file:
+        for index, (slice_path, time_slice) in enumerate(zip(slice_paths, slices)):
+            with open(slice_path, "r", errors="replace") as slice_file:
+                for line in slice_file:
+                    time = get_time(line)
+                    if time is None:
+                        if index == 0 and not written:
+                            output_file.write(line)
+                        continue
+                    if time_slice.contains(time):
+                        output_file.write(line)
+                        written += 1
+    return written
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import shutil
+import threading
+
+import common.helpers as helpers
+
+# bump when the way outputs are stored changes
+SOLVE_CACHE_VERSION = 1
+# <key>.used: empty marker whose mtime is the last use of the entry
+USED_SUFFIX = ".used"
+
+
+def _link_or_copy(src, dst):
+    """Hard link src to dst, or copy it; never a symlink, the source may be evicted or removed"""
+    try:
+        os.link(src, dst)
+    except (OSError, AttributeError):
+        shutil.copyfile(src, dst)
+
+
+class SolveCache:
+    """
+    rnx2rtkp outputs stored by the content of everything that determines them:
+    rover obs, base obs, nav file, the config file, the command line options and
+    the solver binary. Re-solving the same hour with the same inputs restores the
+    .pos file (and its .stat/_events side files) from the cache instead of running
+    the solver. Entries are <key>.<suffix> files, evicted least recently used
+    first once the directory grows past max_bytes.
+    The entry files are hard links of solve outputs, so their mtime is never
+    touched: recency is the mtime of a separate <key>.used marker, and restoring
+    an entry does not make the outputs sharing its inodes look modified to the
+    processing ledger (common.ledger fingerprints by size and mtime).
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir.replace("\\", "/")
+        self.max_bytes = max_bytes
+        # content hashes by (path, size, mtime), the base files are shared by every rover
+        self.digests = {}
+        self.lock = threading.Lock()
+
+    def get_digest(self, path):
+        """sha256 of the content of path, computed once per file version"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        file_key = (path, stat.st_size, stat.st_mtime_ns)
+        with self.lock:
+            if file_key in self.digests:
+                return self.digests[file_key]
+        digest = hashlib.sha256()
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(1024 * 1024), b""):
+                digest.update(chunk)
+        with self.lock:
+            self.digests[file_key] = digest.hexdigest()
+        return self.digests[file_key]
+
+    def get_key(self, input_files, config_file, bin_file, options):
+        """Cache key of one solve; input order matters, it is the rnx2rtkp argument order"""
+        parts = [str(SOLVE_CACHE_VERSION), options]
+        parts.extend(self.get_digest(path) for path in [bin_file, config_file] + list(input_files))
+        return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+    def _get_entries(self, key):
+        if not os.path.exists(self.cache_dir):
+            return []
+        prefix = f"{key}."
+        return [
+            name for name in os.listdir(self.cache_dir)
+            if name.startswith(prefix) and not name.endswith((".tmp", USED_SUFFIX))
+        ]
+
+    def _mark_used(self, key):
+        """Set the recency of key for the eviction, on the marker and not on the shared entry files"""
+        used_path = os.path.join(self.cache_dir, key + USED_SUFFIX)
+        with open(used_path, "a"):
+            pass
+        os.utime(used_path)
+
+    # output_X.pos -> <key>.pos, output_X.pos.stat -> <key>.pos.stat, output_X_events.pos -> <key>._events.pos
+    def _to_suffix(self, name, stem):
+        suffix = name[len(stem):]
+        return suffix[1:] if suffix.startswith(".") else suffix
+
+    def _from_suffix(self, suffix, stem):
+        return stem + suffix if suffix.startswith("_") else f"{stem}.{suffix}"
+
+    def restore(self, key, outputs, output_name):
+        """
+        Put the cached outputs of key into outputs (common.completion.PendingOutputs)
+        under the names of output_name. Returns False on a cache miss.
+        """
+        entries = self._get_entries(key)
+        if f"{key}.pos" not in entries:
+            return False
+        stem = os.path.splitext(output_name)[0]
+        for name in entries:
+            cached_path = os.path.join(self.cache_dir, name)
+            _link_or_copy(cached_path, outputs.path(self._from_suffix(name[len(key) + 1:], stem)))
+        self._mark_used(key)
+        return True
+
+    def store(self, key, output_paths, output_name):
+        """Add the committed outputs of a solve; the .pos file goes last and marks the entry complete"""
+        stem = os.path.splitext(output_name)[0]
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp_suffix = f".{os.getpid()}.{threading.get_ident()}.tmp"
+        paths = sorted(
+            (path for path in output_paths if os.path.basename(path).startswith(stem)),
+            key=lambda path: os.path.basename(path) == output_name
+        )
+        for path in paths:
+            cached_path = os.path.join(self.cache_dir, f"{key}.{self._to_suffix(os.path.basename(path), stem)}")
+            _link_or_copy(path, cached_path + tmp_suffix)
+            os.replace(cached_path + tmp_suffix, cached_path)
+        self._mark_used(key)
+        helpers.evict_lru_files(self.cache_dir, self.max_bytes)
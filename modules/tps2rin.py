@@ -1,15 +1,21 @@
 import os
-import subprocess
 import json
 import sys
-import common.parser as cfg
+import threading
+import time
 import common.helpers as helpers
+from common.completion import PendingOutputs, run_to_completion
+from modules.backends import get_backend
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '../../modules'))
 
 class TPS2RINProcessor:
     def __init__(self):
         self.cur_dir = os.path.split(os.path.abspath(__file__))[0]
+        # modules.backends: which tps2rin runs and how its command line is built
+        self.backend = get_backend()
+        # common.ledger.ProcessingLedger; when set it replaces tpsprocess.txt for finding new files
+        self.ledger = None
 
     def get_tps_file_names(self, dir_path):
         """
@@ -28,11 +34,78 @@ class TPS2RINProcessor:
         Process all TPS files in the input directory that haven't been processed yet
         """
         self._prepare_output_directory(output_dir)
-        last_processed_file_path = self._get_last_processed_file(processed_path)
-        need_process_files = self._get_files_to_process(input_dir, last_processed_file_path)
+        need_process_files = self.get_unprocessed_tps_files(input_dir, processed_path)
         
         self._process_files(need_process_files, output_dir, processed_path)
 
+    def get_unprocessed_tps_files(self, input_dir, processed_path):
+        """
+        Get the TPS files in input_dir that are newer than the process log,
+        or that the ledger has no finished conversion for
+        """
+        last_processed_file_path = self._get_last_processed_file(processed_path)
+        if self.ledger is None:
+            return self._get_files_to_process(input_dir, last_processed_file_path)
+
+        file_paths = [entry.path for entry in os.scandir(input_dir) if entry.is_file()]
+        self.ledger.seed_from_last_path("convert", os.path.abspath(input_dir), file_paths, last_processed_file_path)
+        return self.ledger.get_pending("convert", file_paths)
+
+    def process_tps_files_from_queue(self, file_queue, output_dir, processed_path, workers=2):
+        """
+        Convert TPS files as they are published on file_queue (e.g. by FTPDownloader.download_files)
+        with a pool of converter threads. Returns once None is read from the queue and all
+        conversions finished. Files are numbered in queue order and the process log only
+        advances past the contiguous run of converted files.
+        The queue is always read up to its None, even when the conversion fails, so a
+        producer never blocks on a full queue.
+        """
+        try:
+            self._convert_files_from_queue(file_queue, output_dir, processed_path, workers)
+        finally:
+            self._drain_queue(file_queue)
+
+    def _drain_queue(self, file_queue):
+        """Read file_queue up to its None; files left unconverted are picked up by the next cycle"""
+        skipped = 0
+        while file_queue.get() is not None:
+            skipped += 1
+        if skipped:
+            print(f"-> {skipped} downloaded files left unconverted")
+
+    def _convert_files_from_queue(self, file_queue, output_dir, processed_path, workers):
+        self._prepare_output_directory(output_dir)
+        queue_lock = threading.Lock()
+        log_lock = threading.Lock()
+        counter = {"queued": 0, "logged": 0}
+        converted = {}
+
+        def convert_worker():
+            while True:
+                with queue_lock:
+                    file_path = file_queue.get()
+                    if file_path is None:
+                        # leave the end marker for the other workers
+                        file_queue.put(None)
+                        return
+                    index = counter["queued"]
+                    counter["queued"] += 1
+
+                started = time.time()
+                success = self.exec_tps2rin(file_path, output_dir)
+                self._record_conversion(file_path, success, started)
+                with log_lock:
+                    converted[index] = (file_path, success)
+                    while converted.get(counter["logged"], (None, False))[1]:
+                        self._update_process_log(processed_path, converted.pop(counter["logged"])[0])
+                        counter["logged"] += 1
+
+        threads = [threading.Thread(target=convert_worker) for _ in range(max(1, workers))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
     def _prepare_output_directory(self, output_dir):
         """
         Create output directory if it doesn't exist and clear its contents
@@ -72,23 +145,35 @@ class TPS2RINProcessor:
         Process each file and update the log
         """
         for i in range(len(files_to_process)):
-            if self.exec_tps2rin(files_to_process[i], output_dir):
+            started = time.time()
+            success = self.exec_tps2rin(files_to_process[i], output_dir)
+            self._record_conversion(files_to_process[i], success, started)
+            if success:
                 self._update_process_log(processed_path, files_to_process[i])
                 pass
             else:
                 print(f"-> {files_to_process[i]} processed. Skipping...")
                 continue
 
+    def _record_conversion(self, tps_file_path, success, started):
+        """Store the outcome of a conversion in the ledger, if there is one"""
+        if self.ledger is not None:
+            self.ledger.record("convert", tps_file_path, "done" if success else "failed", started)
+
     def exec_tps2rin(self, tps_file_path, output_dir):
         """
-        Execute the tps2rin command for a single file
+        Execute the tps2rin command for a single file.
+        The RINEX files are converted into a hidden directory and moved into output_dir
+        only when tps2rin exited with 0 and wrote non-empty output (common.completion).
         """
         try:
-            os.chdir(self.cur_dir)
-            cmd = f'tps2rin.exe -i "{tps_file_path}" -o "{output_dir}"'
-            subprocess.call(cmd, shell=cfg.LOGGING)
-            os.chdir("..")
-            return True
+            outputs = PendingOutputs(output_dir)
+            # run with cwd instead of os.chdir so several conversions can run at once
+            cmd = self.backend.get_tps2rin_command(tps_file_path, outputs.tmp_dir)
+            committed = run_to_completion(
+                f"tps2rin {os.path.basename(tps_file_path)}", cmd, outputs, cwd=self.cur_dir
+            )
+            return committed is not None
         except Exception as e:
             print(f"-> Error executing tps2rin: {e}")
             return False
@@ -1,14 +1,40 @@
+import argparse
 import os
 import subprocess
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 from apscheduler.schedulers.blocking import BlockingScheduler
-from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED
+from apscheduler.events import EVENT_JOB_ERROR, EVENT_JOB_EXECUTED, EVENT_JOB_MAX_INSTANCES, EVENT_JOB_MISSED
 import logging
 
 class JobScheduler:
-    def __init__(self, interval_seconds=5):
+    def __init__(self, interval_seconds=5, mode="subprocess", timing="interval",
+                 grace_seconds=120, max_interval_seconds=3600):
+        """
+        mode "subprocess" starts a fresh main.py for every run.
+        mode "daemon" imports the processor once and runs each cycle in this process,
+        keeping GNSSProcessor, the parsed config and the FTP sessions between runs.
+
+        timing "interval" runs every interval_seconds.
+        timing "arrival" follows the hourly file close of the receivers: after a run that
+        found new raw files it checks again after interval_seconds, otherwise the delay
+        doubles up to max_interval_seconds, and is never later than the next hour close
+        plus grace_seconds.
+        Overlapping runs are never started in either timing, missed runs are coalesced.
+        """
         self.interval_seconds = interval_seconds
+        self.mode = mode
+        self.timing = timing
+        self.grace_seconds = grace_seconds
+        self.max_interval_seconds = max_interval_seconds
+        self.idle_runs = 0
+        self.expected_arrival = None
+        self.data_dir = os.path.join(os.path.split(os.path.abspath(__file__))[0], "data")
         self.scheduler = BlockingScheduler(daemon=True)
+        self.processor = None
+        self.cfg = None
+        self.config_path = None
+        self.config_mtime = None
         self.setup_logging()
         
     def setup_logging(self):
@@ -23,8 +49,68 @@ class JobScheduler:
         )
         self.logger = logging.getLogger('JobScheduler')
 
+    def setup_daemon(self):
+        """Import and initialize the processor once for the daemon mode"""
+        base_dir = os.path.split(os.path.abspath(__file__))[0]
+        # common.parser reads device_db.json from the working directory
+        os.chdir(base_dir)
+
+        from importlib import reload
+        import common.parser as cfg
+        from stable_gnss_processor import GNSSProcessor
+
+        self.processor = GNSSProcessor()
+        self.processor.keep_ftp_sessions = True
+        # GNSSProcessor rewrites data_dir in device_db.json
+        self.cfg = reload(cfg)
+        self.config_path = os.path.join(base_dir, "device_db.json")
+        self.config_mtime = os.path.getmtime(self.config_path)
+
+    def reload_config_if_changed(self):
+        """Re-read device_db.json only when the file changed since the last cycle"""
+        from importlib import reload
+
+        mtime = os.path.getmtime(self.config_path)
+        if mtime == self.config_mtime:
+            return False
+        self.logger.info("device_db.json changed, reloading configuration")
+        reload(self.cfg)
+        # FTP credentials, backend and pipeline settings may have changed
+        self.processor.reload_settings()
+        self.config_mtime = mtime
+        return True
+
+    def run_cycle(self):
+        """Run one processing cycle in-process and log the stage timings"""
+        start = time.perf_counter()
+        self.reload_config_if_changed()
+        results = self.processor.run_cycle()
+        duration = time.perf_counter() - start
+
+        timings = ", ".join(
+            f"{name}={result['duration']:.1f}s" if result["status"] == "done" else f"{name}={result['status']}"
+            for name, result in results.items()
+        )
+        self.logger.info(f"Cycle finished in {duration:.1f}s: {timings}")
+
+        failed = [name for name, result in results.items() if result["status"] == "failed"]
+        if failed:
+            self.logger.error(
+                "Failed stages: " + ", ".join(f"{name} ({results[name]['error']})" for name in failed)
+            )
+        return results
+
     def run_job(self):
         """Execute the main job"""
+        if self.mode == "daemon":
+            try:
+                current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                self.logger.info(f"Job started at {current_date}")
+                return self.run_cycle()
+            except Exception as e:
+                self.logger.error(f"Error executing job: {str(e)}")
+                raise
+
         try:
             current_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             self.logger.info(f"Job started at {current_date}")
@@ -52,30 +138,106 @@ class JobScheduler:
             self.logger.error(f"Error executing job: {str(e)}")
             raise
 
+    def get_raw_files_snapshot(self):
+        """Size of every downloaded file in data/<device>/raw"""
+        snapshot = {}
+        if not os.path.isdir(self.data_dir):
+            return snapshot
+        with os.scandir(self.data_dir) as devices:
+            for device in devices:
+                raw_dir = os.path.join(device.path, "raw")
+                if not device.is_dir() or not os.path.isdir(raw_dir):
+                    continue
+                with os.scandir(raw_dir) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            snapshot[entry.path] = entry.stat().st_size
+        return snapshot
+
+    def execute_job(self):
+        """Run the job and return what it found, passed to the listener as event.retval"""
+        start = time.perf_counter()
+        before = self.get_raw_files_snapshot()
+        self.run_job()
+        after = self.get_raw_files_snapshot()
+
+        new_files = [path for path, size in after.items() if size > before.get(path, 0)]
+        return {
+            "new_files": len(new_files),
+            "new_bytes": sum(after[path] - before.get(path, 0) for path in new_files),
+            "duration": time.perf_counter() - start,
+        }
+
+    def get_next_run_time(self, new_files, now=None):
+        """Next run for the arrival timing, see __init__"""
+        now = now or datetime.now()
+        if new_files:
+            self.idle_runs = 0
+        elif self.expected_arrival and now >= self.expected_arrival:
+            # the hourly file is late, poll at the short interval again
+            self.idle_runs = 0
+        else:
+            self.idle_runs += 1
+        delay = min(self.interval_seconds * 2 ** self.idle_runs, self.max_interval_seconds)
+
+        next_close = now.replace(minute=0, second=0, microsecond=0) + timedelta(hours=1)
+        expected_arrival = next_close + timedelta(seconds=self.grace_seconds)
+        # still inside the grace window of the hour that just closed
+        if now < expected_arrival - timedelta(hours=1):
+            expected_arrival -= timedelta(hours=1)
+        self.expected_arrival = expected_arrival
+        return min(now + timedelta(seconds=delay), expected_arrival)
+
     def on_job_executed(self, event):
         """Handle successful job execution"""
+        if event.code == EVENT_JOB_MAX_INSTANCES:
+            self.logger.warning('Job skipped: previous run still in progress')
+            return
+        if event.code == EVENT_JOB_MISSED:
+            self.logger.warning(f'Job run missed at {event.scheduled_run_time}')
+            return
+
+        stats = event.retval or {}
         if event.exception:
             self.logger.error(f'Job failed: {event.exception}')
         else:
-            self.logger.info('Job executed successfully')
+            self.logger.info(
+                f'Job executed successfully: {stats.get("new_files", 0)} new files, '
+                f'{stats.get("new_bytes", 0)} bytes in {stats.get("duration", 0.0):.1f}s'
+            )
+
+        if self.timing == "arrival":
+            next_run_time = self.get_next_run_time(stats.get("new_files", 0))
+            self.scheduler.modify_job('main_job', next_run_time=next_run_time)
+            self.logger.info(f'Next run at {next_run_time.strftime("%Y-%m-%d %H:%M:%S")}')
 
     def start(self):
         """Start the scheduler"""
         try:
-            self.logger.info(f"Starting scheduler with {self.interval_seconds} second interval")
-            
-            # Add the job
+            self.logger.info(
+                f"Starting scheduler in {self.mode} mode, {self.timing} timing, {self.interval_seconds} second interval"
+            )
+            if self.mode == "daemon":
+                self.setup_daemon()
+
+            # Add the job; in arrival timing the listener moves next_run_time after every run
+            # and the interval trigger is only the fallback
+            interval_seconds = self.max_interval_seconds if self.timing == "arrival" else self.interval_seconds
             self.scheduler.add_job(
-                self.run_job, 
-                'interval', 
-                seconds=self.interval_seconds,
-                id='main_job'
+                self.execute_job,
+                'interval',
+                seconds=interval_seconds,
+                id='main_job',
+                next_run_time=datetime.now(),
+                max_instances=1,
+                coalesce=True,
+                misfire_grace_time=interval_seconds
             )
 
             # Add listeners for job events
             self.scheduler.add_listener(
-                self.on_job_executed, 
-                EVENT_JOB_ERROR | EVENT_JOB_EXECUTED
+                self.on_job_executed,
+                EVENT_JOB_ERROR | EVENT_JOB_EXECUTED | EVENT_JOB_MAX_INSTANCES | EVENT_JOB_MISSED
             )
 
             # Start the scheduler
@@ -91,12 +253,35 @@ class JobScheduler:
     def stop(self):
         """Stop the scheduler"""
         try:
+            if self.processor:
+                # solver processes run in their own sessions and miss Ctrl-C, kill them so the running cycle ends
+                self.processor.solver.shutdown(wait=False, cancel=True)
             self.scheduler.shutdown()
+            if self.processor:
+                self.processor.shutdown(cancel=True)
             self.logger.info("Scheduler stopped")
         except Exception as e:
             self.logger.error(f"Error stopping scheduler: {str(e)}")
 
 if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--mode", choices=["subprocess", "daemon"], default="subprocess",
+                            help="spawn main.py for every run, or keep the processor resident")
+    arg_parser.add_argument("--interval", type=int, default=5, help="seconds between runs")
+    arg_parser.add_argument("--timing", choices=["interval", "arrival"], default="interval",
+                            help="fixed interval, or follow the hourly file close of the receivers")
+    arg_parser.add_argument("--grace", type=int, default=120,
+                            help="seconds after the hourly file close before the files are expected")
+    arg_parser.add_argument("--max-interval", type=int, default=3600,
+                            help="longest delay between runs in arrival timing")
+    args = arg_parser.parse_args()
+
     # Create and start the scheduler
-    scheduler = JobScheduler(interval_seconds=5)
+    scheduler = JobScheduler(
+        interval_seconds=args.interval,
+        mode=args.mode,
+        timing=args.timing,
+        grace_seconds=args.grace,
+        max_interval_seconds=args.max_interval
+    )
     scheduler.start()
\ No newline at end of file
@@ -1,32 +1,64 @@
+import argparse
+import functools
 import json
 import os
+import queue
+import threading
 import time
+from concurrent.futures import ProcessPoolExecutor
 from importlib import reload
-from multiprocessing.pool import ThreadPool
-
-import pandas as pd
 
 import common.helpers as helpers
 import common.parser as cfg
+from common.executor import SolverExecutor
+from common.ledger import ProcessingLedger, get_fingerprint
+from common.pipeline import Pipeline
+from common.staging import StagingArea
+from common.watcher import DirectoryWatcher
 from modules.datastream.ftp import FTPDownloader
+from modules.datastream.outputmerge import OutputMerger
 from modules.datastream.posfile import RTKPos
+from modules.datastream.posfollow import RTKPosFollower
+from modules.datastream.posstat import RTKPosStat
+from modules.datastream.resultstore import ResultStore
 from modules.rnx2rtkp import RNX2RTKPProcessor
 from modules.tps2rin import TPS2RINProcessor
 
 
+def _aggregate_pos_file(local_dir, file_path, data_rover_east, data_rover_north, data_rover_up):
+    """
+    Aggregate a single .pos file in a worker process.
+    The checkpoint log is left to the parent process.
+    Returns (result, per-reason line counters, start time)
+    """
+    rtkpos = RTKPos(local_dir)
+    calculate_rtkp_output_file = rtkpos.get_engine(cfg.DATA_ENGINE, cfg.DATA_BINNED)
+    counters = {}
+    started = time.time()
+    result = calculate_rtkp_output_file(file_path, None, data_rover_east, data_rover_north, data_rover_up, counters)
+    return result, counters, started
+
+
 class GNSSProcessor:
     def __init__(self):
-        self.last_x = None
-        self.last_y = None
-        self.last_z = None
-        
         self.r2r = RNX2RTKPProcessor()
         self.t2r = TPS2RINProcessor()
+        self.pos_stat = RTKPosStat()
+        # reuse FTP connections across cycles when running resident (schedule.py --mode daemon)
+        self.keep_ftp_sessions = False
+        self.downloaders = {}
+        # data/ledger.db when pipeline.ledger is on, see get_ledger
+        self.ledger = None
+        # one bounded pool for the rnx2rtkp jobs of every rover
+        self.solver = SolverExecutor(cfg.PIPELINE_SOLVER_WORKERS, cfg.PIPELINE_SOLVER_TIMEOUT)
 
         helpers.create_dir_if_not_exists(os.path.join(os.path.split(os.path.abspath(__file__))[0], "data"))
         helpers.create_dir_if_not_exists(os.path.join(os.path.split(os.path.abspath(__file__))[0], "data/Base/"))
-        helpers.create_dir_if_not_exists(os.path.join(os.path.split(os.path.abspath(__file__))[0], "data/Rover1/"))
-        helpers.create_dir_if_not_exists(os.path.join(os.path.split(os.path.abspath(__file__))[0], "data/Rover2/"))
+        for rover in cfg.ROVERS:
+            for settings in rover["ftp"]:
+                helpers.create_dir_if_not_exists(
+                    os.path.join(os.path.split(os.path.abspath(__file__))[0], "data", settings["local_dir"])
+                )
 
         self.data_dir = os.path.split(os.path.abspath(__file__))[0][0].capitalize() + os.path.join(os.path.split(os.path.abspath(__file__))[0], "data").replace("\\", "/")[1:]
         self._update_data_dir_in_config()
@@ -54,15 +86,19 @@ class GNSSProcessor:
 
     def get_last_output(self, file_path):
         try:
-            with open(file_path, "r") as file:
-                lines = file.readlines()
-                if len(lines) < 2:
+            with open(file_path, "rb") as file:
+                # only the last line is needed, read backwards from the end of the file
+                file.seek(0, os.SEEK_END)
+                size = file.tell()
+                file.seek(max(0, size - 4096))
+                lines = file.read().decode("utf-8").splitlines()
+                if not lines or size <= 4096 and len(lines) < 2:
                     return None
 
                 last_line = lines[-1]
                 data = last_line.split(",")
                 return {
-                    "timestamp": float(data[0]),
+                    "timestamp": data[0].strip('"'),
                     "averageX": float(data[1]),
                     "averageY": float(data[2]),
                     "averageZ": float(data[3]),
@@ -70,8 +106,70 @@ class GNSSProcessor:
         except Exception:
             return None
 
+    def get_ledger(self):
+        """
+        The processing ledger shared by the fetch, convert, solve and aggregate stages, or None
+        when pipeline.ledger is off and the tpsprocess.txt/posprocess.txt checkpoints are used
+        """
+        if cfg.PIPELINE_LEDGER and self.ledger is None:
+            self.ledger = ProcessingLedger(os.path.join(cfg.DATA_DIR, "ledger.db"))
+        self.t2r.ledger = self.ledger
+        return self.ledger
+
+    def get_downloader(self, settings):
+        """
+        FTPDownloader for the given device settings.
+        With keep_ftp_sessions the connection is reused across cycles; check_connection
+        reconnects it when it went idle for longer than the FTP timeout.
+        """
+        if not self.keep_ftp_sessions:
+            downloader = FTPDownloader(settings)
+        else:
+            key = (settings["host"], settings["port"], settings["username"])
+            downloader = self.downloaders.get(key)
+            if downloader is None or downloader.ftp is None:
+                downloader = FTPDownloader(settings)
+                self.downloaders[key] = downloader
+        downloader.ledger = self.get_ledger()
+        return downloader
+
+    def release_downloader(self, downloader):
+        """Disconnect after a fetch, unless sessions are kept warm"""
+        if not self.keep_ftp_sessions:
+            downloader.disconnect()
+
+    def close_downloaders(self):
+        """Disconnect all kept FTP sessions"""
+        for downloader in self.downloaders.values():
+            downloader.disconnect()
+        self.downloaders = {}
+
+    def shutdown(self, cancel=False):
+        """Release FTP sessions, the ledger and the solver pool; cancel=True kills running solves"""
+        self.close_downloaders()
+        self.solver.shutdown(wait=True, cancel=cancel)
+        if self.ledger:
+            self.ledger.close()
+            self.ledger = None
+
+    def reload_settings(self):
+        """
+        Rebuild what was built from common.parser at init, after device_db.json was reloaded
+        between cycles: the rnx2rtkp/tps2rin processors (backend, slicing, solve cache), the
+        solver pool (pipeline.solver_workers, solver_timeout), the ledger and the FTP sessions
+        """
+        self.close_downloaders()
+        self.solver.shutdown(wait=True)
+        self.solver = SolverExecutor(cfg.PIPELINE_SOLVER_WORKERS, cfg.PIPELINE_SOLVER_TIMEOUT)
+        self.r2r = RNX2RTKPProcessor()
+        self.t2r = TPS2RINProcessor()
+        if self.ledger:
+            # pipeline.ledger may have been turned off, get_ledger opens it again when on
+            self.ledger.close()
+            self.ledger = None
+
     def fetch_base_files(self, start_date=None, start_time=None):
-        downloader = FTPDownloader(cfg.FTP_BASE_SETTINGS)
+        downloader = self.get_downloader(cfg.FTP_BASE_SETTINGS)
         base_file_paths = downloader.get_unprocessed_files_in_remote_path(
             cfg.FTP_BASE_SETTINGS["data_dir"], 
             cfg.FTP_BASE_SETTINGS["prefix"], 
@@ -79,9 +177,10 @@ class GNSSProcessor:
         )
         base_local_file_paths = downloader.generate_local_file_paths(cfg.BASE_DATA_DIR, base_file_paths, start_date, start_time)
         downloader.download_files(base_file_paths, base_local_file_paths)
-        downloader.disconnect()
+        self.release_downloader(downloader)
 
     def process_base_files(self):
+        self.get_ledger()
         self.t2r.process_all_tps_files_in_path(
             cfg.BASE_DATA_DIR,
             cfg.BASE_DATA_DIR_PROCESSED,
@@ -93,7 +192,7 @@ class GNSSProcessor:
             rover_local_dir = os.path.join(cfg.DATA_DIR, settings["local_dir"])
             rover_data_dir = os.path.join(rover_local_dir, "raw")
 
-            downloader = FTPDownloader(settings)
+            downloader = self.get_downloader(settings)
             rover_file_paths = downloader.get_unprocessed_files_in_remote_path(
                 settings["data_dir"], 
                 settings["prefix"], 
@@ -101,9 +200,10 @@ class GNSSProcessor:
             )
             rover_local_file_paths = downloader.generate_local_file_paths(rover_data_dir, rover_file_paths, start_date, start_time)
             downloader.download_files(rover_file_paths, rover_local_file_paths)
-            downloader.disconnect()
+            self.release_downloader(downloader)
 
     def process_rover_files(self, settings_list):
+        self.get_ledger()
         for settings in settings_list:
             rover_local_dir = os.path.join(cfg.DATA_DIR, settings["local_dir"])
             rover_data_dir = os.path.join(rover_local_dir, "raw")
@@ -115,6 +215,7 @@ class GNSSProcessor:
             )
 
     def process_rnx2rtkp(self, settings_list, data_rover_east, data_rover_north, data_rover_up):
+        self.get_ledger()
         base_tps_file_names = self.t2r.get_tps_file_names(cfg.BASE_DATA_DIR_PROCESSED)
         base_file_prefix = cfg.FTP_BASE_SETTINGS["prefix"]
 
@@ -128,12 +229,27 @@ class GNSSProcessor:
                 data_rover_up
             )
 
+    def solve_rover_files(self, settings_list):
+        self.get_ledger()
+        base_tps_file_names = self.t2r.get_tps_file_names(cfg.BASE_DATA_DIR_PROCESSED)
+        base_file_prefix = cfg.FTP_BASE_SETTINGS["prefix"]
+
+        for settings in settings_list:
+            self._solve_single_rover(settings, base_tps_file_names, base_file_prefix)
+
+    def aggregate_rover_files(self, settings_list, data_rover_east, data_rover_north, data_rover_up):
+        for settings in settings_list:
+            self._aggregate_single_rover(settings, data_rover_east, data_rover_north, data_rover_up)
+
     def _process_single_rover(self, settings, base_tps_file_names, base_file_prefix,
                             data_rover_east, data_rover_north, data_rover_up):
+        self._solve_single_rover(settings, base_tps_file_names, base_file_prefix)
+        self._aggregate_single_rover(settings, data_rover_east, data_rover_north, data_rover_up)
+
+    def _solve_single_rover(self, settings, base_tps_file_names, base_file_prefix):
         rover_local_dir = os.path.join(cfg.DATA_DIR, settings["local_dir"])
         rover_data_dir_processed = os.path.join(rover_local_dir, "process")
         rover_output_dir = os.path.join(rover_local_dir, "output")
-        rover_output_file_path = os.path.join(rover_local_dir, "output.csv")
 
         tps_file_groups = self.r2r.generate_input_file_groups(
             base_tps_file_names, 
@@ -143,10 +259,66 @@ class GNSSProcessor:
         )
 
         helpers.create_dir_if_not_exists(rover_output_dir)
-        
-        pool = ThreadPool(50)
-        pool_payload = [(file_group, rover_output_dir) for file_group in tps_file_groups]
-        pool.starmap(self.r2r.process_file_group, pool_payload)
+
+        # fingerprints are taken before solving, a solved group's rover files are removed
+        fingerprints = {}
+        if self.ledger:
+            tps_file_groups, fingerprints = self._get_pending_solves(tps_file_groups, rover_output_dir)
+
+        jobs = [
+            self.solver.submit(self.r2r.process_file_group, file_group, rover_output_dir, name=file_group["time_name"])
+            for file_group in tps_file_groups
+        ]
+        for job in jobs:
+            job.wait()
+        if self.ledger:
+            for job in jobs:
+                output_file_path = self._get_solve_output_path(rover_output_dir, job.name)
+                self.ledger.record(
+                    "solve", output_file_path, "done" if job.status == "done" else "failed",
+                    job.started, job.error or (None if job.status == "done" else job.status),
+                    fingerprints[output_file_path]
+                )
+        for job in jobs:
+            if job.status != "done":
+                print(f"-> Solve {settings['local_dir']} {job.name}: {job.status} {job.error or ''}")
+        if jobs:
+            durations = [job.duration for job in jobs if job.duration is not None]
+            print(
+                f"-> Solved {sum(job.status == 'done' for job in jobs)}/{len(jobs)} {settings['local_dir']} groups"
+                + (f", longest {max(durations):.1f}s" if durations else "")
+            )
+
+    def _get_solve_output_path(self, output_dir, time_name):
+        return os.path.join(output_dir, f"output_{time_name}.pos").replace("\\", "/")
+
+    def _get_pending_solves(self, file_groups, output_dir):
+        """
+        The groups the ledger has no finished solve for, or whose rover obs, base obs or
+        nav file changed since, or whose .pos file is gone; with the fingerprint of each
+        group's inputs by output path
+        """
+        groups = {}
+        fingerprints = {}
+        for file_group in file_groups:
+            output_file_path = self._get_solve_output_path(output_dir, file_group["time_name"])
+            try:
+                fingerprints[output_file_path] = "|".join(
+                    get_fingerprint(file_group[key]) for key in ("obs_rover_file", "obs_base_file", "nav_base_file")
+                )
+            except OSError:
+                # removed while listing
+                continue
+            groups[output_file_path] = file_group
+        pending = set(self.ledger.get_pending_fingerprints("solve", fingerprints.items()))
+        pending.update(path for path in groups if not os.path.exists(path))
+        return [groups[path] for path in groups if path in pending], fingerprints
+
+    def _aggregate_single_rover(self, settings, data_rover_east, data_rover_north, data_rover_up):
+        rover_local_dir = os.path.join(cfg.DATA_DIR, settings["local_dir"])
+        rover_output_dir = os.path.join(rover_local_dir, "output")
+        rover_output_file_path = os.path.join(rover_local_dir, "output.csv")
+        helpers.create_dir_if_not_exists(rover_output_dir)
 
         self._process_pos_files(
             rover_output_file_path,
@@ -159,115 +331,485 @@ class GNSSProcessor:
 
     def _process_pos_files(self, output_file_path, output_dir, local_dir,
                           data_rover_east, data_rover_north, data_rover_up):
-        self.rtkpos = RTKPos(local_dir)
-        self.rtkpos.create_output_file(output_file_path)
-        time.sleep(1)
+        # per call, the aggregate stages of different rovers run at the same time
+        rtkpos = RTKPos(local_dir)
+        rtkpos.create_output_file(output_file_path)
         rtkp_output_log_path = os.path.join(local_dir, "posprocess.txt")
-        rtkp_output_file_paths = self.rtkpos.get_unprocessed_rtkp_output_file_paths(
+        rtkp_output_file_paths = rtkpos.get_unprocessed_rtkp_output_file_paths(
             output_dir,
-            rtkp_output_log_path
+            rtkp_output_log_path,
+            self.get_ledger()
         )
 
-        last_output = self.get_last_output(output_file_path)
-        if last_output:
-            self.last_x = last_output["averageX"]
-            self.last_y = last_output["averageY"]
-            self.last_z = last_output["averageZ"]
-
-        with open(output_file_path, "a") as output_file:
+        result_store = None
+        if cfg.DATA_RESULT_STORE == "sqlite":
+            result_store = ResultStore(os.path.join(local_dir, "results.db"))
+            if result_store.is_empty() and os.path.exists(output_file_path):
+                result_store.import_csv(output_file_path)
+            last_output = result_store.last()
+        else:
+            last_output = self.get_last_output(output_file_path)
+
+        metrics_file_path = os.path.join(local_dir, "posmetrics.csv")
+        rtkpos.create_output_file(metrics_file_path, rtkpos.METRICS_FILE_HEADERS)
+
+        if result_store:
+            # output.csv is exported from the store after the new results are in
+            try:
+                with result_store, open(metrics_file_path, "a") as metrics_file:
+                    self._process_rtkp_files(
+                        rtkpos,
+                        last_output,
+                        rtkp_output_file_paths,
+                        rtkp_output_log_path,
+                        result_store,
+                        data_rover_east,
+                        data_rover_north,
+                        data_rover_up,
+                        metrics_file
+                    )
+                result_store.export_csv(output_file_path, rtkpos.OUTPUT_FILE_HEADERS)
+            finally:
+                result_store.close()
+            return
+
+        with open(output_file_path, "a") as output_file, open(metrics_file_path, "a") as metrics_file:
             self._process_rtkp_files(
+                rtkpos,
+                last_output,
                 rtkp_output_file_paths,
                 rtkp_output_log_path,
                 output_file,
                 data_rover_east,
                 data_rover_north,
-                data_rover_up
+                data_rover_up,
+                metrics_file
             )
 
-    def _process_rtkp_files(self, file_paths, log_path, output_file,
-                           data_rover_east, data_rover_north, data_rover_up):
+    def _process_rtkp_files(self, rtkpos, last_output, file_paths, log_path, output_file,
+                           data_rover_east, data_rover_north, data_rover_up, metrics_file=None):
+        pos_file_paths = []
+        stat_summary_path = os.path.join(rtkpos.local_dir, "posstat.csv")
         for file_path in file_paths:
-            if file_path.endswith('.pos.stat') or file_path.endswith('_events.pos'):
+            if file_path.endswith('.pos.stat'):
+                # giu lai tom tat residual theo gio/ve tinh truoc khi xoa file stat
+                self.pos_stat.summarize_and_remove(file_path, stat_summary_path)
+                continue
+            if file_path.endswith('_events.pos'):
                 helpers.remove_file(file_path)
                 continue
+            pos_file_paths.append(file_path)
+
+        if cfg.DATA_AGGREGATION_WORKERS > 1 and len(pos_file_paths) > 1:
+            self._process_rtkp_files_parallel(
+                rtkpos,
+                last_output,
+                pos_file_paths,
+                log_path,
+                output_file,
+                data_rover_east,
+                data_rover_north,
+                data_rover_up,
+                metrics_file
+            )
+            return
 
-            result = self.rtkpos.calculate_rtkp_output_file(
+        calculate_rtkp_output_file = rtkpos.get_engine(cfg.DATA_ENGINE, cfg.DATA_BINNED)
+        for file_path in pos_file_paths:
+            counters = {}
+            started = time.time()
+            result = calculate_rtkp_output_file(
                 file_path, 
                 log_path, 
                 data_rover_east,
                 data_rover_north,
-                data_rover_up
+                data_rover_up,
+                counters
             )
+            if self.ledger:
+                self.ledger.record("aggregate", file_path, "done", started)
+            if metrics_file:
+                rtkpos.write_metrics(metrics_file, file_path, result, counters)
 
             if not result:
                 continue
 
-            self._write_output(result, output_file)
+            self._write_results(result, output_file, last_output)
 
-    def _write_output(self, result, output_file):
-        ts = f'"{result["timestamp"]}"'
+    def _process_rtkp_files_parallel(self, rtkpos, last_output, file_paths, log_path, output_file,
+                                    data_rover_east, data_rover_north, data_rover_up, metrics_file=None):
+        """
+        Aggregate .pos files in a process pool.
+        Results are written in timestamp (file name) order and the checkpoint only
+        advances past the contiguous run of completed files.
+        """
+        file_paths = sorted(file_paths)
+        last_completed_path = None
+
+        with ProcessPoolExecutor(max_workers=cfg.DATA_AGGREGATION_WORKERS) as executor:
+            futures = [
+                executor.submit(
+                    _aggregate_pos_file,
+                    rtkpos.local_dir,
+                    file_path,
+                    data_rover_east,
+                    data_rover_north,
+                    data_rover_up
+                )
+                for file_path in file_paths
+            ]
+            for file_path, future in zip(file_paths, futures):
+                try:
+                    result, counters, started = future.result()
+                except Exception as e:
+                    print(f"-> Error aggregating {file_path}: {e}")
+                    if self.ledger:
+                        self.ledger.record("aggregate", file_path, "failed", error=str(e))
+                    for pending in futures:
+                        pending.cancel()
+                    break
+
+                if self.ledger:
+                    self.ledger.record("aggregate", file_path, "done", started)
+                if metrics_file:
+                    rtkpos.write_metrics(metrics_file, file_path, result, counters)
+                if result:
+                    self._write_results(result, output_file, last_output)
+                last_completed_path = file_path
+
+        if last_completed_path:
+            rtkpos.update_log(log_path, last_completed_path)
+
+    def _write_results(self, result, output_file, last_output=None):
+        # che do binned tra ve mot dong cho moi khoang DATA_INTERVAL
+        for row in (result if isinstance(result, list) else [result]):
+            self._write_output(row, output_file, last_output)
+
+    def _get_output_values(self, result, last_output=None):
+        """
+        What to output for one result, shared by the csv file and the ResultStore:
+        (False, None) drops a result that jumped past the DATA_THRESHOLD_DELTA_* limits
+        since last_output (the last row of the rover before this run), (True, None) is a NAN row for an interval without a
+        solution, (True, (averageX, averageY, averageZ)) is a regular row
+        """
         averageX = result["averageX"]
         averageY = result["averageY"]
         averageZ = result["averageZ"]
 
         if (averageX + averageY + averageZ) == 0:
-            output_file.write(f'{ts},"NAN","NAN","NAN"\n')
-        elif not (
-            self.last_x
+            return True, None
+        if (
+            last_output
+            and last_output["averageX"]
             and (
-                abs(averageX - self.last_x) > cfg.DATA_THRESHOLD_DELTA_X
-                or abs(averageY - self.last_y) > cfg.DATA_THRESHOLD_DELTA_Y
-                or abs(averageZ - self.last_z) > cfg.DATA_THRESHOLD_DELTA_Z
+                abs(averageX - last_output["averageX"]) > cfg.DATA_THRESHOLD_DELTA_X
+                or abs(averageY - last_output["averageY"]) > cfg.DATA_THRESHOLD_DELTA_Y
+                or abs(averageZ - last_output["averageZ"]) > cfg.DATA_THRESHOLD_DELTA_Z
             )
         ):
+            return False, None
+        return True, (averageX, averageY, averageZ)
+
+    def _write_output(self, result, output_file, last_output=None):
+        accepted, values = self._get_output_values(result, last_output)
+        if not accepted:
+            return
+
+        if isinstance(output_file, ResultStore):
+            output_file.upsert(result["timestamp"], values)
+            return
+
+        ts = f'"{result["timestamp"]}"'
+        if values is None:
+            output_file.write(f'{ts},"NAN","NAN","NAN"\n')
+        else:
             output_file.write(
                 "{},{},{},{}\n".format(
                     ts,
-                    "{:.5f}".format(averageX),
-                    "{:.5f}".format(averageY),
-                    "{:.5f}".format(averageZ)
+                    "{:.5f}".format(values[0]),
+                    "{:.5f}".format(values[1]),
+                    "{:.5f}".format(values[2])
                 )
             )
 
-    def merge_output_files(self):
-        rv1_output = os.path.join(os.path.split(os.path.abspath(__file__))[0], "data/Rover1/output.csv")
-        rv2_output = os.path.join(os.path.split(os.path.abspath(__file__))[0], "data/Rover2/output.csv")
-        df1 = pd.read_csv(rv1_output)
-        df2 = pd.read_csv(rv2_output)
+    def _fetch_and_convert_files(self, settings, data_dir, data_dir_processed, log_path,
+                                 start_date=None, start_time=None):
+        """
+        Download the new TPS files of one device and convert each file as soon as it lands.
+        Files are handed over on a bounded queue (pipeline.queue_size) so downloads wait
+        when the pipeline.convert_workers tps2rin workers fall behind.
+        """
+        self.get_ledger()
+        file_queue = queue.Queue(maxsize=cfg.PIPELINE_QUEUE_SIZE)
+        converter_errors = []
+
+        def convert():
+            try:
+                self.t2r.process_tps_files_from_queue(
+                    file_queue, data_dir_processed, log_path, cfg.PIPELINE_CONVERT_WORKERS
+                )
+            except Exception as e:
+                converter_errors.append(e)
+
+        converter = threading.Thread(target=convert)
+        converter.start()
+
+        downloader = None
+        try:
+            downloader = self.get_downloader(settings)
+            remote_file_paths = downloader.get_unprocessed_files_in_remote_path(
+                settings["data_dir"],
+                settings["prefix"],
+                data_dir
+            )
+            local_file_paths = downloader.generate_local_file_paths(data_dir, remote_file_paths, start_date, start_time)
+            start_idx, local_file_paths = local_file_paths if local_file_paths else (0, [])
+            remote_file_paths = remote_file_paths[start_idx:]
+
+            # raw files left unconverted by an earlier cycle go first
+            downloading = {os.path.normpath(path) for path in local_file_paths}
+            for file_path in self.t2r.get_unprocessed_tps_files(data_dir, log_path):
+                if os.path.normpath(file_path) not in downloading:
+                    file_queue.put(file_path)
+
+            downloader.download_files(remote_file_paths, local_file_paths, file_queue)
+        finally:
+            if downloader is not None:
+                self.release_downloader(downloader)
+            # the converter reads up to the end marker, unless its thread is gone
+            while converter.is_alive():
+                try:
+                    file_queue.put(None, timeout=1)
+                    break
+                except queue.Full:
+                    continue
+            converter.join()
+        if converter_errors:
+            raise converter_errors[0]
+
+    def fetch_and_process_base_files(self, start_date=None, start_time=None):
+        self._fetch_and_convert_files(
+            cfg.FTP_BASE_SETTINGS,
+            cfg.BASE_DATA_DIR,
+            cfg.BASE_DATA_DIR_PROCESSED,
+            os.path.join(cfg.DATA_DIR, cfg.FTP_BASE_SETTINGS["local_dir"] + "/tpsprocess.txt"),
+            start_date,
+            start_time
+        )
+
+    def fetch_and_process_rover_files(self, settings_list, start_date=None, start_time=None):
+        for settings in settings_list:
+            rover_local_dir = os.path.join(cfg.DATA_DIR, settings["local_dir"])
+            self._fetch_and_convert_files(
+                settings,
+                os.path.join(rover_local_dir, "raw"),
+                os.path.join(rover_local_dir, "process"),
+                os.path.join(rover_local_dir, "tpsprocess.txt"),
+                start_date,
+                start_time
+            )
+
+    def get_rovers(self):
+        """(stage name prefix, settings_list, east, north, up) of every rover in cfg.ROVERS"""
+        return [
+            (rover["name"].lower(), rover["ftp"], rover["east"], rover["north"], rover["up"])
+            for rover in cfg.ROVERS
+        ]
+
+    def build_pipeline(self, max_workers=1, fetch=True):
+        """
+        Declare one processing cycle as a stage graph:
+        base fetch -> base convert; rover fetch -> rover convert;
+        (base convert, rover convert) -> solve -> aggregate; all aggregates -> merge.
+        With pipeline.streaming each fetch/convert pair is a single "convert" stage that
+        converts files while the rest are still downloading.
+        fetch=False leaves out the downloads, the convert stages then only handle local raw files.
+        """
+        pipeline = Pipeline(max_workers)
+        # open the ledger before the stage threads share it
+        self.get_ledger()
+        if not fetch:
+            pipeline.add_stage("base_convert", self.process_base_files)
+        elif cfg.PIPELINE_STREAMING:
+            pipeline.add_stage("base_convert", self.fetch_and_process_base_files)
+        else:
+            pipeline.add_stage("base_fetch", self.fetch_base_files)
+            pipeline.add_stage("base_convert", self.process_base_files, ["base_fetch"])
+
+        rovers = self.get_rovers()
+        for name, settings_list, east, north, up in rovers:
+            if not fetch:
+                pipeline.add_stage(f"{name}_convert", functools.partial(self.process_rover_files, settings_list))
+            elif cfg.PIPELINE_STREAMING:
+                pipeline.add_stage(f"{name}_convert", functools.partial(self.fetch_and_process_rover_files, settings_list))
+            else:
+                pipeline.add_stage(f"{name}_fetch", functools.partial(self.fetch_rover_files, settings_list))
+                pipeline.add_stage(
+                    f"{name}_convert",
+                    functools.partial(self.process_rover_files, settings_list),
+                    [f"{name}_fetch"]
+                )
+            pipeline.add_stage(
+                f"{name}_solve",
+                functools.partial(self.solve_rover_files, settings_list),
+                ["base_convert", f"{name}_convert"]
+            )
+            pipeline.add_stage(
+                f"{name}_aggregate",
+                functools.partial(self.aggregate_rover_files, settings_list, east, north, up),
+                [f"{name}_solve"]
+            )
+
+        pipeline.add_stage("merge", self.merge_output_files, [f"{name}_aggregate" for name, *_ in rovers])
+        return pipeline
+
+    def run_cycle(self):
+        """
+        Run one processing cycle and return the pipeline results per stage.
+        pipeline.mode "concurrent" runs independent branches on pipeline.workers threads,
+        "sequential" runs the stages one by one in the original step order.
+        """
+        max_workers = cfg.PIPELINE_WORKERS if cfg.PIPELINE_MODE == "concurrent" else 1
+        pipeline = self.build_pipeline(max_workers)
+        return self.run_pipeline(pipeline)
 
-        df1['TIMESTAMP'] = pd.to_datetime(df1['TIMESTAMP'])
-        df2['TIMESTAMP'] = pd.to_datetime(df2['TIMESTAMP'])
+    def run_pipeline(self, pipeline, stages=None):
+        """Run the pipeline with one staged copy of the base files shared by all solve jobs"""
+        self.r2r.base_staging = StagingArea(cfg.JOBS_DIR)
+        try:
+            return pipeline.run(stages)
+        finally:
+            self.r2r.base_staging.cleanup()
+            self.r2r.base_staging = None
 
-        merged_df = pd.merge(df1, df2, on='TIMESTAMP', how='outer', suffixes=["", ""])
-        merged_df['TIMESTAMP'] = merged_df['TIMESTAMP'].apply(lambda x: f'"{x}"')
-        merged_df = merged_df.drop_duplicates(["TIMESTAMP"])
+    def get_watched_stages(self):
+        """
+        Map each watched data directory to the stages that consume it:
+        raw -> convert, process -> solve, output -> aggregate.
+        The base process directory feeds the solve stage of every rover.
+        """
+        rovers = self.get_rovers()
+        watched = {
+            os.path.normpath(cfg.BASE_DATA_DIR): ["base_convert"],
+            os.path.normpath(cfg.BASE_DATA_DIR_PROCESSED): [f"{name}_solve" for name, *_ in rovers],
+        }
+        for name, settings_list, *_ in rovers:
+            for settings in settings_list:
+                rover_local_dir = os.path.join(cfg.DATA_DIR, settings["local_dir"])
+                for sub_dir, stage in (("raw", "convert"), ("process", "solve"), ("output", "aggregate")):
+                    dir_path = os.path.normpath(os.path.join(rover_local_dir, sub_dir))
+                    watched.setdefault(dir_path, []).append(f"{name}_{stage}")
+        return watched
+
+    def watch_and_process(self, stop_event=None):
+        """
+        Event-driven processing: wait for files to land in data/<device>/raw, process
+        or output and run only the stages fed by those directories (and the stages
+        after them). Downloads are left to the scheduler or whatever fills raw.
+        """
+        max_workers = cfg.PIPELINE_WORKERS if cfg.PIPELINE_MODE == "concurrent" else 1
+        pipeline = self.build_pipeline(max_workers, fetch=False)
+        watched = self.get_watched_stages()
+        raw_dirs = {dir_path for dir_path, stages in watched.items() if stages[0].endswith("_convert")}
+        watcher = DirectoryWatcher(list(watched), cfg.PIPELINE_WATCH_POLL_SECONDS, cfg.PIPELINE_WATCH_SETTLE_SECONDS)
 
-        output_file = os.path.join(os.path.split(os.path.abspath(__file__))[0], "data/output.csv")
-        merged_df.to_csv(output_file, index=False, quoting=3)
+        try:
+            # catch up with whatever arrived while not watching
+            self.run_pipeline(pipeline)
+            pending = raw_dirs & watcher.drain()
+            while not (stop_event and stop_event.is_set()):
+                changed = pending or watcher.wait(cfg.PIPELINE_WATCH_POLL_SECONDS)
+                if not changed:
+                    continue
+                stages = {stage for dir_path in changed for stage in watched[dir_path]}
+                print(f"-> Changes in {', '.join(sorted(changed))}")
+                self.run_pipeline(pipeline, stages)
+                # process and output were written by the stages that just ran,
+                # only new raw files need another run
+                pending = raw_dirs & watcher.drain()
+        finally:
+            watcher.close()
+
+    def follow_rover_outputs(self, rovers, poll_seconds=None, stop_event=None):
+        """
+        Follow the growing .pos files of each rover (e.g. from rtknavi) and keep
+        data/<Rover>/live.csv updated with the running per-interval averages.
+        rovers: list of (settings_list, east, north, up)
+        """
+        poll_seconds = poll_seconds or cfg.DATA_FOLLOW_POLL_SECONDS
+        followers = []
+        for settings_list, east, north, up in rovers:
+            for settings in settings_list:
+                rover_local_dir = os.path.join(cfg.DATA_DIR, settings["local_dir"])
+                followers.append((
+                    RTKPosFollower(rover_local_dir, east, north, up),
+                    os.path.join(rover_local_dir, "output")
+                ))
+
+        while not (stop_event and stop_event.is_set()):
+            for follower, output_dir in followers:
+                if not os.path.exists(output_dir):
+                    continue
+                if follower.poll(follower.get_followed_file_paths(output_dir)):
+                    print(f"-> Updated {follower.live_path}")
+            time.sleep(poll_seconds)
+
+    def get_output_merger(self):
+        data_dir = os.path.join(os.path.split(os.path.abspath(__file__))[0], "data")
+        rovers = [
+            (rover["columns"], [os.path.join(data_dir, settings["local_dir"], "output.csv") for settings in rover["ftp"]])
+            for rover in cfg.ROVERS
+        ]
+        return OutputMerger(data_dir, rovers, cfg.DATA_MERGE_MAX_LAG_SECONDS)
+
+    def merge_output_files(self):
+        """Append the new rows of every rover output.csv to data/output.csv"""
+        rows = self.get_output_merger().merge()
+        print(f"-> Merged {rows} rows into output.csv")
+
+    def rebuild_merged_output(self):
+        """Rewrite data/output.csv from the full rover output.csv files"""
+        rows = self.get_output_merger().rebuild()
+        print(f"-> Rebuilt output.csv with {rows} rows")
 
 if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser()
+    arg_parser.add_argument("--follow", action="store_true",
+                            help="follow growing .pos files in data/<Rover>/output instead of running a cycle")
+    arg_parser.add_argument("--rebuild-merge", action="store_true",
+                            help="rebuild data/output.csv from the rover output.csv files and exit")
+    arg_parser.add_argument("--watch", action="store_true",
+                            help="process files as they land in data/<device>/raw, process and output")
+    args = arg_parser.parse_args()
+
     print("Step 1: Initializing...\n")
     processor = GNSSProcessor()
     reload(cfg)
-    
-    print("Step 2: Fetch and Pre-process Base...\n")
-    processor.fetch_base_files()
-    processor.process_base_files()
-    
-    print("Step 3: Fetch and Pre-process data from Rover1...\n")
-    processor.fetch_rover_files(cfg.FTP_ROVERS1_SETTINGS)
-    processor.process_rover_files(cfg.FTP_ROVERS1_SETTINGS)
-
-    print("Step 4: Converting Rover1 raw data into POS data...")
-    processor.process_rnx2rtkp(cfg.FTP_ROVERS1_SETTINGS, cfg.DATA_ROVER1_EAST, cfg.DATA_ROVER1_NORTH, cfg.DATA_ROVER1_UP)
-    
-    print("Step 5: Fetch and Pre-process data from Rover2...")
-    processor.fetch_rover_files(cfg.FTP_ROVERS2_SETTINGS)
-    processor.process_rover_files(cfg.FTP_ROVERS2_SETTINGS)
-    
-    print("Step 6: Converting Rover2 raw data into POS data...")
-    processor.process_rnx2rtkp(cfg.FTP_ROVERS2_SETTINGS, cfg.DATA_ROVER2_EAST, cfg.DATA_ROVER2_NORTH, cfg.DATA_ROVER2_UP)
-    
-    print("Step 7: Data assembly")
-    processor.merge_output_files()
-    print("All Processes Done!")
\ No newline at end of file
+
+    # job processes run in their own sessions and do not get Ctrl-C, cancel=True kills them
+    cancel = False
+    try:
+        if args.follow:
+            processor.follow_rover_outputs([rover[1:] for rover in processor.get_rovers()])
+            raise SystemExit
+
+        if args.rebuild_merge:
+            processor.rebuild_merged_output()
+            raise SystemExit
+
+        if args.watch:
+            processor.watch_and_process()
+            raise SystemExit
+
+        print(f"Step 2: Running {cfg.PIPELINE_MODE} pipeline...\n")
+        results = processor.run_cycle()
+    except KeyboardInterrupt:
+        cancel = True
+        raise
+    finally:
+        processor.shutdown(cancel=cancel)
+    failed = [name for name, result in results.items() if result["status"] == "failed"]
+    if failed:
+        print(f"Failed stages: {', '.join(failed)}")
+        raise SystemExit(1)
+    print("All Processes Done!")